@@ -1,17 +1,23 @@
 import sys
 import discord
-from discord.ext import commands
-from datetime import timedelta, datetime, timezone
-import mysql.connector
-from mysql.connector import Error
+from discord.ext import commands, tasks
+from datetime import timedelta, datetime, timezone, time as dt_time
 from discord.utils import utcnow
 import os
 import asyncio
+import csv
+import gzip
+import json
+import re
+import tempfile
+from contextlib import aclosing
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
-from dbconnMOD import add_mod_log, get_warnings, remove_warning, get_notes, add_note_to_db
+from dbpool import DB_ERRORS, create_pool, close_pool
+from modimport import import_mod_logs, source_key
+from dbconnMOD import add_mod_log, archive_expired_logs, flush_mod_logs, get_audit_log_cursor, ingest_audit_log_batch, get_mod_logs_page, iter_mod_logs, search_mod_records, get_activity_rollup, reaggregate_activity, get_user_summary, get_warning_counts, remove_warning, has_notes, get_notes_page, add_note_to_db
 
 JRMOD_ROLE_ID = int(os.getenv('JRMOD_ROLE_ID', 0))
 MODS_ROLE_ID = int(os.getenv('MODS_ROLE_ID', 0))
@@ -24,13 +30,316 @@ print(f"Loaded Role IDs: {JRMOD_ROLE_ID}, {MODS_ROLE_ID}, {ADMINS_ROLE_ID}, {CO_
 warnings = {"minor": {}, "major": {}}
 todo_lists = {}
 
+NOTES_PAGE_SIZE = 5
+LOG_PAGE_SIZE = 10
+EXPORT_BATCH_SIZE = 2000
+
+# Days before a warning is moved to mod_logs_archive; 0 keeps it live forever
+RETENTION_DAYS = {
+    "minor_warning": int(os.getenv('MINOR_WARNING_RETENTION_DAYS', 0)),
+    "major_warning": int(os.getenv('MAJOR_WARNING_RETENTION_DAYS', 0)),
+}
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+AUDIT_LOG_POLL_MINUTES = float(os.getenv('AUDIT_LOG_POLL_MINUTES', 5))
+AUDIT_LOG_BATCH_SIZE = 200
+# Days of rollups the nightly job rebuilds from mod_logs; 0 rebuilds everything
+ROLLUP_REAGGREGATE_DAYS = int(os.getenv('ROLLUP_REAGGREGATE_DAYS', 7))
+STATS_RANGE = re.compile(r"^(\d+)([dw])$")
+EXPORT_COLUMNS = ["log_id", "user_id", "moderator_id", "action_type", "timestamp", "reason", "archived"]
+
 def get_permissions(permissions):
     return [perm.replace("_", " ").title() for perm, value in permissions if value]
 
+def audit_entry_to_row(entry):
+    """Maps a ban, kick, unban or timeout audit log entry onto a mod log row. Returns None for anything else."""
+    if entry.action == discord.AuditLogAction.ban:
+        action_type = "ban"
+    elif entry.action == discord.AuditLogAction.kick:
+        action_type = "kick"
+    elif entry.action == discord.AuditLogAction.unban:
+        action_type = "unban"
+    elif entry.action == discord.AuditLogAction.member_update:
+        before = getattr(entry.before, "timed_out_until", None)
+        after = getattr(entry.after, "timed_out_until", None)
+        if after is not None and after != before:
+            action_type = "timeout"
+        elif before is not None and after is None:
+            action_type = "timeremove"
+        else:
+            return None
+    else:
+        return None
+    if entry.target is None:
+        return None
+
+    reason = entry.reason or "No reason provided"
+    if action_type == "timeout":
+        reason = f"timeout until {after:%d/%m/%Y %H:%M} UTC: {reason}"
+    moderator_id = entry.user_id or (entry.user.id if entry.user else "")
+    return (str(entry.target.id), reason, str(moderator_id), action_type, entry.created_at.strftime('%Y-%m-%d %H:%M:%S'))
+
+def parse_stats_args(args):
+    """Parses `!modstats` arguments into (moderator_id, days). Defaults to everyone over 7 days."""
+    moderator_id, days = None, 7
+    for arg in args:
+        match = STATS_RANGE.match(arg.lower())
+        if match:
+            days = int(match[1]) * (7 if match[2] == "w" else 1)
+            continue
+        digits = arg.strip("<@!>")
+        if not digits.isdigit():
+            raise ValueError(f"Expected a moderator or a range like `7d` or `4w`, got `{arg}`")
+        moderator_id = int(digits)
+    return moderator_id, max(1, min(days, 366))
+
+def parse_export_options(options):
+    """Parses `!modexport` options like `jsonl since=2024-01-01 action=ban,kick moderator=123`."""
+    parsed = {"format": "csv", "since": None, "until": None, "action_types": None, "moderator_id": None}
+    for token in options.split():
+        key, _, value = token.partition("=")
+        key = key.lower()
+        if not value and key in ("csv", "jsonl"):
+            parsed["format"] = key
+        elif key in ("since", "until"):
+            parsed[key] = datetime.strptime(value, "%Y-%m-%d")
+        elif key == "action":
+            parsed["action_types"] = [a for a in value.split(",") if a]
+        elif key == "moderator":
+            parsed["moderator_id"] = int(value)
+        else:
+            raise ValueError(f"Unknown option `{token}`")
+    return parsed
+
+def write_export_batch(handle, fmt, rows):
+    """Writes one batch of mod log rows to an open gzip text file."""
+    if fmt == "jsonl":
+        handle.writelines(json.dumps({c: row[c] for c in EXPORT_COLUMNS}, default=str) + "\n" for row in rows)
+    else:
+        csv.writer(handle).writerows([row[c] for c in EXPORT_COLUMNS] for row in rows)
+
+class NotesPager(discord.ui.View):
+    """Ephemeral pager that loads a user's notes one page at a time."""
+
+    def __init__(self, user_id: int):
+        super().__init__(timeout=300)
+        self.user_id = user_id
+        self.cursors = [None]  # before_id for each page visited so far
+        self.next_cursor = None
+
+    async def build_page(self):
+        notes, has_more = await get_notes_page(self.user_id, self.cursors[-1], NOTES_PAGE_SIZE)
+        self.next_cursor = notes[-1]["note_id"] if has_more else None
+        self.newer.disabled = len(self.cursors) == 1
+        self.older.disabled = self.next_cursor is None
+
+        embed = discord.Embed(title=f"Mod Notes for {self.user_id}", color=discord.Color.blue())
+        if not notes:
+            embed.description = "No notes found."
+        for n in notes:
+            author = f"<@{n['moderator_id']}>" if n["moderator_id"] else "unknown"
+            date = n["created_at"].strftime("%d/%m/%Y") if n["created_at"] else "unknown date"
+            embed.add_field(name=f"#{n['note_id']} - {date}", value=f"{n['note'][:900]}\nby {author}", inline=False)
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    @discord.ui.button(label="Newer", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.build_page(), view=self)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.build_page(), view=self)
+
+class ModLogPager(discord.ui.View):
+    """Button pager over mod logs. Each page is one keyset query for LOG_PAGE_SIZE rows."""
+
+    def __init__(self, author_id: int, title: str, summary: str = None, **filters):
+        super().__init__(timeout=300)
+        self.author_id = author_id
+        self.title = title
+        self.summary = summary
+        self.filters = filters
+        self.cursors = [None]  # cursor that starts each page visited so far
+        self.next_cursor = None
+        self.message = None
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Only the person who ran the command can change pages.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+    async def build_page(self):
+        rows, self.next_cursor = await get_mod_logs_page(cursor=self.cursors[-1], limit=LOG_PAGE_SIZE, **self.filters)
+        self.newer.disabled = len(self.cursors) == 1
+        self.older.disabled = self.next_cursor is None
+
+        offset = (len(self.cursors) - 1) * LOG_PAGE_SIZE
+        lines = [
+            f"{offset + i + 1}. [{r['log_id']}]{' 🗄️' if r['archived'] else ''} **{r['action_type']}** {r['reason'][:200]} - "
+            f"user <@{r['user_id']}> by <@{r['moderator_id']}> - "
+            f"{r['timestamp'].strftime('%d/%m/%Y') if r['timestamp'] else 'unknown date'}"
+            for i, r in enumerate(rows)
+        ]
+        embed = discord.Embed(title=self.title, description="\n".join(lines) or "None", color=discord.Color.orange())
+        footer = f"Page {len(self.cursors)}"
+        if self.summary:
+            footer = f"{self.summary} | {footer}"
+        embed.set_footer(text=footer)
+        return embed
+
+    @discord.ui.button(label="Newer", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.build_page(), view=self)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.build_page(), view=self)
+
+class SearchPager(ModLogPager):
+    """ModLogPager over ranked !modsearch hits. Relevance order has no stable key, so pages use offsets."""
+
+    def __init__(self, author_id: int, terms: str):
+        super().__init__(author_id, title=f"Search: {terms[:200]}")
+        self.terms = terms
+        self.cursors = [0]
+
+    async def build_page(self):
+        offset = self.cursors[-1]
+        hits, has_more = await search_mod_records(self.terms, offset, LOG_PAGE_SIZE)
+        self.next_cursor = offset + LOG_PAGE_SIZE if has_more else None
+        self.newer.disabled = len(self.cursors) == 1
+        self.older.disabled = self.next_cursor is None
+
+        lines = []
+        for i, h in enumerate(hits):
+            label = (f"[{h['record_id']}]{' 🗄️' if h['archived'] else ''} **{h['action_type']}**"
+                     if h["source"] == "log" else f"[note #{h['record_id']}]")
+            date = h["timestamp"].strftime("%d/%m/%Y") if h["timestamp"] else "unknown date"
+            author = f"<@{h['moderator_id']}>" if h["moderator_id"] else "unknown"
+            lines.append(f"{offset + i + 1}. {label} {h['text'][:200]} - user <@{h['user_id']}> by {author} - {date}")
+        embed = discord.Embed(title=self.title, description="\n".join(lines) or "No matches.", color=discord.Color.orange())
+        embed.set_footer(text=f"Page {len(self.cursors)} | Best matches first")
+        return embed
+
+class ViewNotesButton(discord.ui.DynamicItem[discord.ui.Button], template=r"view_notes_(?P<user_id>\d+)"):
+    """The whois "View Notes" button. Registered as a dynamic item so it keeps working after restarts."""
+
+    def __init__(self, user_id: int):
+        super().__init__(discord.ui.Button(label="View Notes", style=discord.ButtonStyle.secondary, custom_id=f"view_notes_{user_id}"))
+        self.user_id = user_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["user_id"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        staff_roles = {MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID}
+        if not any(role.id in staff_roles for role in getattr(interaction.user, "roles", [])):
+            await interaction.response.send_message("You don't have permission to view notes.", ephemeral=True)
+            return
+        pager = NotesPager(self.user_id)
+        await interaction.response.send_message(embed=await pager.build_page(), view=pager, ephemeral=True)
+
 class Mod(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        # Open the mod log pool before the first command needs it
+        await create_pool()
+        self.bot.add_dynamic_items(ViewNotesButton)
+        if any(days > 0 for days in RETENTION_DAYS.values()):
+            self.archive_expired_warnings.start()
+        self.ingest_audit_logs.change_interval(minutes=AUDIT_LOG_POLL_MINUTES)
+        self.ingest_audit_logs.start()
+        self.reaggregate_rollups.start()
+
+    async def cog_unload(self):
+        self.archive_expired_warnings.cancel()
+        self.ingest_audit_logs.cancel()
+        self.reaggregate_rollups.cancel()
+        self.bot.remove_dynamic_items(ViewNotesButton)
+        # Write out buffered mod logs before the pool goes away
+        await flush_mod_logs()
+        await close_pool()
+
+    @tasks.loop(minutes=30)
+    async def archive_expired_warnings(self):
+        """Moves warnings past their retention period into mod_logs_archive, one batch at a time."""
+        for action_type, days in RETENTION_DAYS.items():
+            if days <= 0:
+                continue
+            cutoff = (utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            archived = 0
+            while True:
+                moved = await archive_expired_logs(action_type, cutoff, ARCHIVE_BATCH_SIZE)
+                archived += moved
+                if moved < ARCHIVE_BATCH_SIZE:
+                    break
+                await asyncio.sleep(1)  # Leave room for live queries between batches
+            if archived:
+                print(f"Archived {archived} expired {action_type} logs older than {days} days.")
+
+    @archive_expired_warnings.before_loop
+    async def before_archive_expired_warnings(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(minutes=5)
+    async def ingest_audit_logs(self):
+        """Copies bans, kicks and timeouts done outside the bot's commands from the audit log into mod_logs."""
+        for guild in self.bot.guilds:
+            if not guild.me.guild_permissions.view_audit_log:
+                continue
+            try:
+                await self.ingest_guild_audit_log(guild)
+            except discord.HTTPException as e:
+                print(f"Error reading the audit log of {guild.name}: {e}")
+
+    @ingest_audit_logs.before_loop
+    async def before_ingest_audit_logs(self):
+        await self.bot.wait_until_ready()
+
+    async def ingest_guild_audit_log(self, guild):
+        last_id = await get_audit_log_cursor(guild.id)
+        if last_id is None:
+            return  # Database unavailable, try again next round
+        after = discord.Object(id=last_id) if last_id else None
+        rows, newest, seen = [], last_id, 0
+        async for entry in guild.audit_logs(limit=None, after=after, oldest_first=True):
+            newest = entry.id
+            seen += 1
+            # Actions taken through the bot's own commands were already logged with the real moderator,
+            # and other bots' actions (the verification bot's 48h expiry kicks) aren't moderation at all
+            if entry.user_id != self.bot.user.id and not (entry.user is not None and entry.user.bot):
+                row = audit_entry_to_row(entry)
+                if row:
+                    rows.append(row)
+            if seen >= AUDIT_LOG_BATCH_SIZE:
+                if not await ingest_audit_log_batch(rows, guild.id, newest):
+                    return
+                rows, seen = [], 0
+        if newest != last_id and seen:
+            await ingest_audit_log_batch(rows, guild.id, newest)
+
+    @tasks.loop(time=dt_time(hour=3, tzinfo=timezone.utc))
+    async def reaggregate_rollups(self):
+        """Nightly rebuild of recent mod_activity_daily rows from the logs, in case the live counts drifted."""
+        since = (utcnow() - timedelta(days=ROLLUP_REAGGREGATE_DAYS)).date() if ROLLUP_REAGGREGATE_DAYS > 0 else None
+        if await reaggregate_activity(since):
+            print(f"Re-aggregated moderator activity since {since or 'the beginning'}.")
+
     # !purge <count>
     @commands.command(name="purge")
     @commands.has_permissions(manage_messages=True)
@@ -77,7 +386,7 @@ class Mod(commands.Cog):
         embed.add_field(name="Unbanned by", value=ctx.author.mention, inline=True)
         embed.add_field(name="Reason", value=reason, inline=False)
         await ctx.send(embed=embed)
-        add_mod_log(user.id, reason, ctx.author.id, "unban")
+        await add_mod_log(user.id, reason, ctx.author.id, "unban")
 
     # !timeremove <userID>
     @commands.command(name="timeremove")
@@ -90,7 +399,7 @@ class Mod(commands.Cog):
         await member.edit(timed_out_until=None)
         embed = discord.Embed(description=f"⏱️ Timeout removed for {member.mention}.", color=discord.Color.green())
         await ctx.send(embed=embed)
-        add_mod_log(member.id, "Timeout removed", ctx.author.id, "timeremove")
+        await add_mod_log(member.id, "Timeout removed", ctx.author.id, "timeremove")
 
     # !todo <message>
     @commands.command(name="todo")
@@ -124,16 +433,16 @@ class Mod(commands.Cog):
             created_at = member.created_at.replace(tzinfo=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
             joined_at = member.joined_at.replace(tzinfo=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
             roles = ", ".join([role.mention for role in member.roles if role.name != "@everyone"])
-            minor_warnings, major_warnings = get_warnings(user_id)
-            notes = get_notes(user_id)
+            summary = await get_user_summary(user_id)
+            notes = await has_notes(user_id)
         else:
             username = user.name
             user_id = user.id
             created_at = user.created_at.replace(tzinfo=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
             joined_at = "Not in server"
             roles = "Not in server"
-            minor_warnings, major_warnings = get_warnings(user_id)
-            notes = get_notes(user_id)
+            summary = await get_user_summary(user_id)
+            notes = await has_notes(user_id)
 
         embed = discord.Embed(title=f"User Info - {username}", color=discord.Color.blue())
         if member and member.avatar:
@@ -145,51 +454,192 @@ class Mod(commands.Cog):
         embed.add_field(name="Account Created", value=created_at, inline=False)
         embed.add_field(name="Joined Server", value=joined_at, inline=False)
         embed.add_field(name="Roles", value=roles if roles else "None", inline=False)
-        embed.add_field(name="Minor Warnings", value=str(len(minor_warnings)), inline=True)
-        embed.add_field(name="Major Warnings", value=str(len(major_warnings)), inline=True)
+        embed.add_field(name="Minor Warnings", value=str(summary["minor_count"]), inline=True)
+        embed.add_field(name="Major Warnings", value=str(summary["major_count"]), inline=True)
+        if summary["last_action"]:
+            embed.add_field(name="Last Action", value=f"{summary['last_action']} ({summary['last_timestamp'].strftime('%d/%m/%Y')})", inline=True)
         if notes:
             view = discord.ui.View()
-            view.add_item(discord.ui.Button(label="View Notes", style=discord.ButtonStyle.secondary, custom_id=f"view_notes_{user_id}"))
+            view.add_item(ViewNotesButton(user_id))
             embed.add_field(name="Mod Notes", value="Click the button below to view notes.", inline=False)
             await ctx.send(embed=embed, view=view)
         else:
             embed.add_field(name="Mod Notes", value="None", inline=False)
             await ctx.send(embed=embed)
 
-    # !wlist <user_ID>
+    # !wlist <user_ID> [--all]
     @commands.command(name="wlist")
-    async def wlist(self, ctx, user_id: int):
-        minor_warnings, major_warnings = get_warnings(user_id)
-        embed = discord.Embed(title=f"Warnings for <@{user_id}>", color=discord.Color.orange())
-
-        # Minor warnings
-        if minor_warnings:
-            value = "\n".join(
-                f"{i+1}. [{w['log_id']}] {w['reason']} - by <@{w['mod_id']}> - {w['date'].strftime('%d/%m/%Y')}"
-                for i, w in enumerate(minor_warnings)
-            )
-            embed.add_field(name="Minor Warnings", value=value, inline=False)
-        else:
-            embed.add_field(name="Minor Warnings", value="None", inline=False)
+    async def wlist(self, ctx, user_id: int, scope: str = None):
+        include_archived = scope == "--all"
+        minor_count, major_count = await get_warning_counts(user_id)
+        pager = ModLogPager(
+            ctx.author.id,
+            title=f"Warnings for <@{user_id}>" + (" (including archived)" if include_archived else ""),
+            summary=f"Active minor: {minor_count} | Active major: {major_count}",
+            user_id=user_id,
+            action_types=["minor_warning", "major_warning"],
+            include_archived=include_archived
+        )
+        embed = await pager.build_page()
+        pager.message = await ctx.send(embed=embed, view=pager)
+
+    # !modhistory [moderator_ID]
+    @commands.command(name="modhistory")
+    @commands.has_any_role(JRMOD_ROLE_ID, MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
+    async def modhistory(self, ctx, moderator_id: int = None):
+        moderator_id = moderator_id or ctx.author.id
+        pager = ModLogPager(
+            ctx.author.id,
+            title=f"Actions by moderator {moderator_id}",
+            moderator_id=moderator_id
+        )
+        embed = await pager.build_page()
+        pager.message = await ctx.send(embed=embed, view=pager)
+
+    # !modexport [csv|jsonl] [since=YYYY-MM-DD] [until=YYYY-MM-DD] [action=type,type] [moderator=ID]
+    # Warnings moved to mod_logs_archive are included, with archived=1
+    @commands.command(name="modexport")
+    @commands.has_any_role(ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
+    async def modexport(self, ctx, *, options: str = ""):
+        try:
+            opts = parse_export_options(options)
+        except ValueError as e:
+            await ctx.send(embed=discord.Embed(description=f"❌ {e}", color=discord.Color.red()))
+            return
 
-        # Major warnings
-        if major_warnings:
-            value = "\n".join(
-                f"{i+1}. [{w['log_id']}] {w['reason']} - by <@{w['mod_id']}> - {w['date'].strftime('%d/%m/%Y')}"
-                for i, w in enumerate(major_warnings)
-            )
-            embed.add_field(name="Major Warnings", value=value, inline=False)
-        else:
-            embed.add_field(name="Major Warnings", value="None", inline=False)
+        fmt = opts.pop("format")
+        status = await ctx.send(embed=discord.Embed(description="⏳ Exporting mod logs...", color=discord.Color.blue()))
+        # Rows are streamed batch by batch into a temp file, never held in memory all at once
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+        os.close(fd)
+        exported = 0
+        try:
+            handle = gzip.open(path, "wt", newline="", encoding="utf-8")
+            try:
+                if fmt == "csv":
+                    csv.writer(handle).writerow(EXPORT_COLUMNS)
+                # aclosing() hands the streaming connection back even if a write fails
+                async with aclosing(iter_mod_logs(batch_size=EXPORT_BATCH_SIZE, **opts)) as batches:
+                    async for rows in batches:
+                        # Compression is CPU bound, keep it off the event loop
+                        await asyncio.to_thread(write_export_batch, handle, fmt, rows)
+                        exported += len(rows)
+            finally:
+                handle.close()
+
+            size = os.path.getsize(path)
+            limit = ctx.guild.filesize_limit if ctx.guild else 10 * 1024 * 1024
+            if size > limit:
+                await status.edit(embed=discord.Embed(
+                    description=f"❌ Export of {exported} rows is {size / 1048576:.1f} MB, over the {limit / 1048576:.0f} MB upload limit. Narrow the date range.",
+                    color=discord.Color.red()))
+                return
+            filename = f"mod_logs_{utcnow():%Y%m%d_%H%M%S}.{fmt}.gz"
+            await ctx.send(f"📦 Exported {exported} mod log rows.", file=discord.File(path, filename=filename))
+            await status.delete()
+        except DB_ERRORS as e:
+            await status.edit(embed=discord.Embed(description=f"❌ Export failed after {exported} rows: {e}", color=discord.Color.red()))
+        finally:
+            os.remove(path)
+
+    # !modimport (with a CSV/JSON/JSONL export attached)
+    @commands.command(name="modimport")
+    @commands.has_any_role(ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
+    async def modimport(self, ctx, fmt: str = None):
+        if not ctx.message.attachments:
+            await ctx.send(embed=discord.Embed(description="❌ Attach a CSV, JSON or JSONL export to import.", color=discord.Color.red()))
+            return
+        attachment = ctx.message.attachments[0]
+        status = await ctx.send(embed=discord.Embed(description=f"⏳ Importing `{attachment.filename}`...", color=discord.Color.blue()))
+        # Keep the original name so the format can be detected from the extension
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, os.path.basename(attachment.filename))
+        last_update = 0.0
+
+        async def report(stats):
+            nonlocal last_update
+            if asyncio.get_running_loop().time() - last_update < 5:
+                return
+            last_update = asyncio.get_running_loop().time()
+            await status.edit(embed=discord.Embed(
+                description=f"⏳ Importing `{attachment.filename}`: {stats['imported']} rows written, {stats['skipped']} skipped.",
+                color=discord.Color.blue()))
 
-        await ctx.send(embed=embed)
+        try:
+            await attachment.save(path)
+            stats = await import_mod_logs(path, fmt, source=source_key(path, attachment.filename), progress=report)
+            resumed = f" Resumed after record {stats['resumed_from']}." if stats["resumed_from"] else ""
+            await status.edit(embed=discord.Embed(
+                description=f"✅ Imported {stats['imported']} rows from `{attachment.filename}`, skipped {stats['skipped']}, in {stats['elapsed']:.1f}s.{resumed}",
+                color=discord.Color.green()))
+        except (RuntimeError, ValueError, csv.Error, discord.HTTPException) as e:
+            await status.edit(embed=discord.Embed(description=f"❌ {e}", color=discord.Color.red()))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    # !modsearch <terms>
+    @commands.command(name="modsearch")
+    @commands.has_any_role(JRMOD_ROLE_ID, MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
+    async def modsearch(self, ctx, *, terms: str):
+        pager = SearchPager(ctx.author.id, terms)
+        embed = await pager.build_page()
+        pager.message = await ctx.send(embed=embed, view=pager)
+
+    # !modstats [moderator] [7d|4w]
+    @commands.command(name="modstats")
+    @commands.has_any_role(JRMOD_ROLE_ID, MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
+    async def modstats(self, ctx, *args):
+        try:
+            moderator_id, days = parse_stats_args(args)
+        except ValueError as e:
+            await ctx.send(embed=discord.Embed(description=f"❌ {e}", color=discord.Color.red()))
+            return
+        since = (utcnow() - timedelta(days=days - 1)).date()
+        rows = await get_activity_rollup(since, moderator_id)
+        if rows is None:
+            await ctx.send(embed=discord.Embed(description="❌ Could not load moderator activity.", color=discord.Color.red()))
+            return
 
+        by_action, by_period, by_moderator = {}, {}, {}
+        for r in rows:
+            day = r["day"]
+            # Up to two weeks show day by day, longer ranges by week starting Monday
+            period = day if days <= 14 else day - timedelta(days=day.weekday())
+            by_action[r["action_type"]] = by_action.get(r["action_type"], 0) + r["action_count"]
+            by_period[period] = by_period.get(period, 0) + r["action_count"]
+            by_moderator[r["moderator_id"]] = by_moderator.get(r["moderator_id"], 0) + r["action_count"]
+
+        title = f"Moderator activity - last {days} days"
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        if moderator_id:
+            embed.description = f"Actions by <@{moderator_id}>"
+        if not rows:
+            embed.description = (embed.description + "\n" if embed.description else "") + "No actions in this range."
+        else:
+            embed.add_field(name="Total", value=str(sum(by_action.values())), inline=False)
+            embed.add_field(
+                name="By action",
+                value="\n".join(f"{action}: {count}" for action, count in sorted(by_action.items(), key=lambda item: -item[1])),
+                inline=True
+            )
+            embed.add_field(
+                name="By day" if days <= 14 else "By week",
+                value="\n".join(f"{period:%d/%m}: {count}" for period, count in sorted(by_period.items()))[:1024],
+                inline=True
+            )
+            if moderator_id is None:
+                top = sorted(by_moderator.items(), key=lambda item: -item[1])[:5]
+                embed.add_field(name="Most active", value="\n".join(f"<@{mod}>: {count}" for mod, count in top), inline=False)
+        embed.set_footer(text="From daily rollups, re-checked against the logs nightly")
+        await ctx.send(embed=embed)
 
     # !note <user_ID> <message>
     @commands.command(name="note")
     @commands.has_any_role(MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
     async def note(self, ctx, user_id: int, *, message: str):
-        if add_note_to_db(user_id, message):
+        if await add_note_to_db(user_id, message, ctx.author.id):
             await ctx.send(embed=discord.Embed(description=f"✅ Added note for <@{user_id}>.", color=discord.Color.green()))
         else:
             await ctx.send(embed=discord.Embed(description=f"❌ Failed to add note.", color=discord.Color.red()))
@@ -216,7 +666,7 @@ class Mod(commands.Cog):
         embed.add_field(name="Duration", value=f'{duration} {unit}', inline=True)
         embed.add_field(name="Reason", value=reason, inline=False)
         await ctx.send(embed=embed)
-        add_mod_log(member.id, f"timeout: {duration} {unit}", ctx.author.id, "timeout")
+        await add_mod_log(member.id, f"timeout: {duration} {unit}", ctx.author.id, "timeout")
 
     # !wminor <userID> <reason>
     @commands.command(name="wminor")
@@ -241,7 +691,7 @@ class Mod(commands.Cog):
     @commands.command(name="wremoveminor")
     @commands.has_any_role(JRMOD_ROLE_ID, MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
     async def wremoveminor(self, ctx, user_id: int, log_id: int):
-        if remove_warning(user_id, "minor", log_id):
+        if await remove_warning(user_id, "minor", log_id):
             await ctx.send(embed=discord.Embed(description=f"✅ Successfully removed **minor** warning for user <@{user_id}> (LogID: {log_id})", color=discord.Color.green()))
         else:
             await ctx.send(embed=discord.Embed(description=f"❌ Failed to remove **minor** warning for user <@{user_id}>. Either the warning doesn't exist or there was an error.", color=discord.Color.red()))
@@ -250,7 +700,7 @@ class Mod(commands.Cog):
     @commands.command(name="wremovemajor")
     @commands.has_any_role(JRMOD_ROLE_ID, MODS_ROLE_ID, ADMINS_ROLE_ID, CO_OWNERS_ROLE_ID, OWNERS_ROLE_ID, BOT_MANAGER_ID)
     async def wremovemajor(self, ctx, user_id: int, log_id: int):
-        if remove_warning(user_id, "major", log_id):
+        if await remove_warning(user_id, "major", log_id):
             await ctx.send(embed=discord.Embed(description=f"✅ Successfully removed **major** warning for user <@{user_id}> (LogID: {log_id})", color=discord.Color.green()))
         else:
             await ctx.send(embed=discord.Embed(description=f"❌ Failed to remove **major** warning for user <@{user_id}>. Either the warning doesn't exist or there was an error.", color=discord.Color.red()))
@@ -269,7 +719,7 @@ class Mod(commands.Cog):
         embed.add_field(name="Kicked by", value=ctx.author.mention, inline=True)
         embed.add_field(name="Reason", value=reason, inline=False)
         await ctx.send(embed=embed)
-        add_mod_log(member.id, reason, ctx.author.id, "kick")
+        await add_mod_log(member.id, reason, ctx.author.id, "kick")
         try:
             await member.send(f'You have been kicked from {ctx.guild.name} for: {reason}')
         except discord.Forbidden:
@@ -289,7 +739,7 @@ class Mod(commands.Cog):
         embed.add_field(name="Banned by", value=ctx.author.mention, inline=True)
         embed.add_field(name="Reason", value=reason, inline=False)
         await ctx.send(embed=embed)
-        add_mod_log(member.id, reason, ctx.author.id, "ban")
+        await add_mod_log(member.id, reason, ctx.author.id, "ban")
         try:
             await member.send(f'You have been banned from {ctx.guild.name} for: {reason}')
         except discord.Forbidden:
@@ -302,11 +752,11 @@ class Mod(commands.Cog):
             return
     
         # Save directly to DB
-        add_mod_log(member.id, reason, ctx.author.id, f"{warning_type}_warning")
+        await add_mod_log(member.id, reason, ctx.author.id, f"{warning_type}_warning")
     
         # Embed feedback
-        minor_warnings, major_warnings = get_warnings(member.id)
-        total_warnings = len(minor_warnings) if warning_type == "minor" else len(major_warnings)
+        minor_count, major_count = await get_warning_counts(member.id)
+        total_warnings = minor_count if warning_type == "minor" else major_count
     
         embed = discord.Embed(title=f"{warning_type.capitalize()} Warning Issued", color=discord.Color.orange())
         embed.add_field(name="User", value=member.mention, inline=True)
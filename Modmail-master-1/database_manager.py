@@ -1,21 +1,82 @@
-import aiomysql
 import logging
+import os
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dbpool import DictCursor, backend_name
+from sqlite_backend import create_sqlite_pool
+
 logger = logging.getLogger("modmail.db")
 
+# Only used by the SQLite backend; the MySQL tables are managed on the host
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS active_tickets (
+        channel_id BIGINT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        member_username VARCHAR(100),
+        mod_username VARCHAR(100),
+        category_id BIGINT,
+        channel_name VARCHAR(100),
+        created_at DATETIME,
+        closed_at DATETIME,
+        status VARCHAR(20) NOT NULL DEFAULT 'open',
+        ticket_type VARCHAR(50),
+        mod_id BIGINT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_active_tickets_user_status ON active_tickets (user_id, status);",
+    """
+    CREATE TABLE IF NOT EXISTS ticket_timers (
+        timer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id BIGINT NOT NULL,
+        user_id BIGINT,
+        action VARCHAR(20) NOT NULL,
+        execute_at DATETIME NOT NULL,
+        canceled BOOLEAN NOT NULL DEFAULT FALSE
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ticket_timers_due ON ticket_timers (canceled, execute_at);",
+    "CREATE INDEX IF NOT EXISTS idx_ticket_timers_channel ON ticket_timers (channel_id, action);",
+    """
+    CREATE TABLE IF NOT EXISTS ticket_watchers (
+        channel_id BIGINT NOT NULL,
+        mod_id BIGINT NOT NULL,
+        PRIMARY KEY (channel_id, mod_id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dx_responses (
+        `key` VARCHAR(100) PRIMARY KEY,
+        response TEXT NOT NULL
+    );
+    """,
+]
+
 class DatabaseManager:
     def __init__(self, bot):
         self.bot = bot
         self.pool = None
 
     async def setup(self):
+        if backend_name() == "sqlite":
+            self.pool = await create_sqlite_pool(os.getenv("MODMAIL_SQLITE_PATH", "modmail.db"))
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    for statement in SQLITE_SCHEMA:
+                        await cur.execute(statement)
+            logger.info("SQLite database ready.")
+            return
+
+        import aiomysql
         self.pool = await aiomysql.create_pool(
-            host="gameswaw1.bisecthosting.com",
-            port=3306,
-            user="u404394_zmjisvvtS8",
-            password="M7hB3OutjkNCIPHl7DM6dyhF",
-            db="s404394_DixieMessenger",
+            host=os.getenv("MODMAIL_DB_HOST"),
+            port=int(os.getenv("MODMAIL_DB_PORT", 3306)),
+            user=os.getenv("MODMAIL_DB_USER"),
+            password=os.getenv("MODMAIL_DB_PASSWORD"),
+            db=os.getenv("MODMAIL_DB_NAME"),
             autocommit=True
         )
         logger.info("Database connection pool established.")
@@ -78,7 +139,7 @@ class DatabaseManager:
 
     async def get_ticket_by_channel(self, channel_id: int):
         async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
+            async with conn.cursor(DictCursor) as cur:
                 await cur.execute(
                     "SELECT * FROM active_tickets WHERE channel_id=%s AND status='open'",
                     (channel_id,)
@@ -146,7 +207,7 @@ class DatabaseManager:
 
     async def get_pending_timers(self):
         async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
+            async with conn.cursor(DictCursor) as cur:
                 await cur.execute("""
                     SELECT * FROM ticket_timers
                     WHERE canceled=FALSE AND execute_at <= NOW()
@@ -0,0 +1,151 @@
+"""Pre-rendered image CAPTCHAs for the verification cog.
+
+Rendering runs in a ProcessPoolExecutor so Pillow never blocks the event
+loop. CaptchaPool keeps up to `size` finished challenges ready; a join takes
+one in O(1) and a background task renders replacements. Pillow comes with
+requirements.txt; on an install without it captcha_available() is False and
+verification stays on plain passwords.
+"""
+import asyncio
+import io
+import random
+import secrets
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:  # Image challenges are optional
+    Image = None
+
+# No 0/O, 1/I or similar pairs that are hard to tell apart in a distorted image
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+def captcha_available():
+    return Image is not None
+
+
+def _font(size):
+    for name in ("DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        return ImageFont.load_default()
+
+
+def render_captcha(text, seed):
+    """Renders `text` as a distorted PNG and returns the bytes. Runs in a worker process."""
+    rng = random.Random(seed)
+    width, height = 60 + 36 * len(text), 90
+    image = Image.new("RGB", (width, height), (rng.randint(220, 255), rng.randint(220, 255), rng.randint(220, 255)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(width * height // 40):
+        draw.point((rng.randrange(width), rng.randrange(height)), fill=tuple(rng.randint(120, 220) for _ in range(3)))
+
+    font = _font(44)
+    x = 25
+    for char in text:
+        glyph = Image.new("RGBA", (60, 70), (0, 0, 0, 0))
+        ImageDraw.Draw(glyph).text((8, 4), char, font=font, fill=tuple(rng.randint(0, 110) for _ in range(3)))
+        glyph = glyph.rotate(rng.uniform(-28, 28), resample=Image.BICUBIC, expand=False)
+        image.paste(glyph, (x + rng.randint(-4, 4), rng.randint(0, 18)), glyph)
+        x += 36
+
+    for _ in range(5):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(2)]
+        draw.line(points, fill=tuple(rng.randint(60, 160) for _ in range(3)), width=rng.randint(1, 3))
+    image = image.filter(ImageFilter.SMOOTH)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+class CaptchaPool:
+    """Bounded pool of ready (answer, png) challenges, refilled in the background.
+
+    take() is a popleft when the pool has one (a hit); on a miss the image
+    is rendered on demand, still in the process pool.
+    """
+
+    def __init__(self, size=50, workers=2, length=6):
+        self.size = size
+        self.workers = workers
+        self.length = length
+        self.ready = deque()
+        self.hits = 0
+        self.misses = 0
+        self._executor = None
+        self._task = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def new_answer(self):
+        return "".join(secrets.choice(ALPHABET) for _ in range(self.length))
+
+    async def render(self, text):
+        """Renders a challenge image for `text` in the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, render_captcha, text, secrets.randbits(64))
+
+    async def _refill(self):
+        while True:
+            self._wake.clear()
+            missing = self.size - len(self.ready)
+            if missing <= 0:
+                await self._wake.wait()
+                continue
+            # Fill in rounds of one job per worker so a big deficit doesn't starve on-demand renders
+            answers = [self.new_answer() for _ in range(min(missing, self.workers))]
+            try:
+                images = await asyncio.gather(*(self.render(answer) for answer in answers))
+            except Exception as e:
+                print(f"Error rendering captchas: {e}")
+                await asyncio.sleep(30)
+                continue
+            self.ready.extend(zip(answers, images))
+
+    async def take(self):
+        """Returns an (answer, png bytes) challenge, from the ready pool when possible."""
+        self._wake.set()
+        if self.ready:
+            self.hits += 1
+            return self.ready.popleft()
+        self.misses += 1
+        answer = self.new_answer()
+        return answer, await self.render(answer)
+
+    def stats(self):
+        taken = self.hits + self.misses
+        return {
+            "ready": len(self.ready),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / taken if taken else None,
+        }
+
+
+__all__ = [
+    "captcha_available",
+    "render_captcha",
+    "CaptchaPool"
+]
@@ -1,21 +1,19 @@
 import discord
-import re
 import datetime
-import google.generativeai as genai
-from discord.ext import commands
+import os
+import re
+from discord.ext import commands, tasks
 from discord.ui import Button, View
 from currency_converter import CurrencyConverter
-import os
 from dotenv import load_dotenv
-import emoji  
-from dbconnMOD import add_mod_log, get_warnings
+from price_tokenizer import tokenize
+from gemini_client import create_classifier
+from verdict_cache import VerdictCache
+from dbconnMOD import add_mod_log, get_warning_counts
 import asyncio
 
 load_dotenv()
-API_KEY = os.getenv("API_KEY") 
-genai.configure(api_key=API_KEY)
 
-model = genai.GenerativeModel("gemini-pro")  
 c = CurrencyConverter()
 
 intents = discord.Intents.default()
@@ -27,9 +25,40 @@ MOD_LOG_CHANNEL_ID = 1338401271119347743
 WARNING_LOG_CHANNEL_ID = 1243663526715850762
 TARGET_CHANNEL_ID = [1338422604897456129, 1248315045000253530, 1244399296279740558, 1240456287473369170, 1246266893925482641, 1243567009564721243, 1244400051879546930]
 
+MIN_PRICE_USD = 14  # Anything under this breaks the $15 minimum
+SAFE_PRICE_USD = 25  # Messages whose lowest price reaches this are fine without asking Gemini
+# Wording that can make a low price legitimate (add-ons, fees, bulk deals); those messages go to Gemini
+PRICE_QUALIFIERS = re.compile(
+    r"(?i)\b(?:minimum|bundles?|bulk|at least|add[- ]?ons?|extras?|fees?|commercial)\b|\+\s*[$€£¥₹]?\s*\d"
+)
+TIERS = ["no_prices", "above_minimum", "under_minimum", "cached", "llm"]
+
+VERDICT_CACHE_PATH = os.getenv("VERDICT_CACHE_PATH", "verdict_cache.json")
+VERDICT_CACHE_DAYS = float(os.getenv("VERDICT_CACHE_DAYS", "7"))
+
 class Budget(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.classifier = create_classifier()
+        self.tier_counts = dict.fromkeys(TIERS, 0)
+        self.verdicts = VerdictCache(VERDICT_CACHE_PATH, ttl=VERDICT_CACHE_DAYS * 24 * 3600)
+
+    async def cog_load(self):
+        loaded = self.verdicts.load()
+        print(f"Loaded {loaded} cached Gemini verdicts.")
+        self.save_verdicts.start()
+
+    async def cog_unload(self):
+        self.save_verdicts.cancel()
+        await self.save_verdicts_now()
+
+    async def save_verdicts_now(self):
+        if self.verdicts.dirty:
+            await asyncio.to_thread(self.verdicts.save, self.verdicts.snapshot())
+
+    @tasks.loop(minutes=10)
+    async def save_verdicts(self):
+        await self.save_verdicts_now()
         
     log_counter = 1  
 
@@ -38,113 +67,88 @@ class Budget(commands.Cog):
         self.log_counter += 1
         return log_number
 
-    def clean_text(self, text):
-        # Remove links
-        text = re.sub(r"https?://\S+", "", text)
-        
-        # Ignore TAT, TURN AROUND TIME, and SLOTS
-        text = re.sub(r"(?i)(TAT|TURN AROUND TIME|SLOTS)", "", text)
-        
-        # Remove emoji and other unwanted characters
-        text = emoji.replace_emoji(text, replace="")  # Removes any emojis
-        text = re.sub(r"<a?:\w+:\d+>", "", text)  # Removes animated emojis and other special characters
-        
-        return text
-
-
-    def extract_prices(self, text):
-        # Extract prices from the text
-        price_patterns = re.finditer(
-            r"(?P<currency>[$€£¥₹]|USD|EUR|GBP|JPY|INR)?\s*(?P<amount>\d+(?:\.\d+)?)\s*(?P<post_currency>[$€£¥₹]|USD|EUR|GBP|JPY|INR)?",
-            text,
-            re.IGNORECASE,
-        )
-        prices = []
-        currency_map = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
-        
-        for match in price_patterns:
-            pre_currency = match.group("currency")  
-            amount = match.group("amount")  
-            post_currency = match.group("post_currency")  
-            
-            currency_code = currency_map.get(pre_currency, "USD")
-            if post_currency:
-                currency_code = currency_map.get(post_currency, "USD")
-            
-            if amount:
-                prices.append((float(amount), currency_code.upper()))
-        return prices
-
-    def check_price(self, text):
-        # Clean the text to remove unwanted keywords
-        text = self.clean_text(text)
-
-        # Ignore the price range "$100-$140"
-        text = re.sub(r"\$100-\$140", "", text)
-
-        # Extract prices from the text
-        prices = self.extract_prices(text)
-
-        # Check if any price is below $15
+    def prices_in_usd(self, prices):
+        """Converts (amount, currency) price tokens to USD, skipping ones that can't be converted."""
+        converted = []
         for price, currency in prices:
             try:
-                price_in_usd = c.convert(price, currency) if currency in c.currencies else price
-                if price_in_usd < 14:
-                    return True  # Flag this message as INVALID
+                converted.append(c.convert(price, currency) if currency in c.currencies else price)
             except (ValueError, KeyError):
                 pass
-        return False  # No price below $15, so the message is valid
-
+        return converted
+
+    async def classify(self, text, prices):
+        """Settles clear cases with the price rules and only asks Gemini about the rest.
+
+        Returns (verdict, tier) where tier is one of TIERS.
+        """
+        usd = self.prices_in_usd(prices)
+        if not usd:
+            tier, verdict = "no_prices", "VALID"
+        elif min(usd) >= SAFE_PRICE_USD:
+            tier, verdict = "above_minimum", "VALID"
+        elif min(usd) < MIN_PRICE_USD and not PRICE_QUALIFIERS.search(text):
+            tier, verdict = "under_minimum", "INVALID"
+        else:
+            verdict = self.verdicts.get(text)
+            tier = "cached"
+            if verdict is None:
+                tier, verdict = "llm", await self.analyze_with_gemini(text)
+        self.tier_counts[tier] += 1
+        return verdict, tier
 
     async def analyze_with_gemini(self, text):
-        try:
-            model = genai.GenerativeModel("gemini-pro")
-            prompt = f"""
-            You are a moderator assistant reviewing marketplace messages.
-            **Only flag messages as "INVALID" if they contain a price below $15 USD.**
-            **Ignore prices labeled as add-ons, fees, or commercial use fees.**
-            **Bulk deals (e.g., "minimum", "bundle", "bulk", "at least") are valid.**
-            **TAT (Turnaround Time) mentions make the message valid.**
-            ** if mentions of Turn Around Time / TAT then the message is VALID**
-            **If "payment after sketch" are invalid**
-            **User Message:**
-            {text}
-            """
-            response = model.generate_content(prompt)
-            return "INVALID" if "INVALID" in response.text else "VALID"
-        except Exception:
-            return "VALID"  
+        verdict = await self.classifier.verdict(text)
+        if verdict is None:
+            return "VALID"  # Timeouts and API errors aren't cached, the next repost tries again
+        if not self.classifier.stub:
+            # The stub answers the same for everything; caching it would outlive a fixed API key
+            self.verdicts.put(text, verdict)
+        return verdict
+
+    @commands.command(name="budgetstats", help="Shows how marketplace messages were classified and how many Gemini calls were skipped.")
+    @commands.has_permissions(manage_messages=True)
+    async def budget_stats(self, ctx):
+        total = sum(self.tier_counts.values())
+        if not total:
+            await ctx.send("No marketplace messages checked since the bot started.")
+            return
+        skipped = total - self.tier_counts["llm"]
+        if self.classifier.stub:
+            await ctx.send("⚠️ Gemini is not configured: the local stub answers VALID for every message that reaches the llm tier.")
+        tiers = "\n".join(f"{tier}: {self.tier_counts[tier]}" for tier in TIERS)
+        gemini = self.classifier.stats()
+        cache = self.verdicts.stats()
+        hit_rate = f"{cache['hit_rate']:.0%}" if cache["hit_rate"] is not None else "n/a"
+        await ctx.send(
+            f"Checked {total} marketplace messages; {skipped} ({skipped / total:.0%}) settled without calling Gemini.\n"
+            f"{tiers}\n"
+            f"Gemini: {gemini['calls']} calls, {gemini['invalid']} flagged, "
+            f"{gemini['timeouts']} timeouts, {gemini['errors']} errors\n"
+            f"Verdict cache: {cache['entries']}/{cache['max_entries']} entries, "
+            f"{cache['hits']} hits, {cache['misses']} misses (hit rate {hit_rate})"
+        )
 
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author.bot:
             return
 
-        # Initialize variables to ensure they are always defined
-        regex_check = None
-        ai_check = "VALID"  # Default to "VALID" for AI check, since we don't flag it by default
-
         # Check if the message is in the target channels
-        if message.channel.id in TARGET_CHANNEL_ID:
-            text_without_links = self.clean_text(message.content)
-
-            # Debugging: print the cleaned text
-            print(f"Cleaned message content: {text_without_links}")
+        if message.channel.id not in TARGET_CHANNEL_ID:
+            return
 
-            # Check using regex
-            regex_check = self.check_price(text_without_links)
+        text_without_links, prices = tokenize(message.content)
 
-            # Debugging: print the result of regex check
-            print(f"Regex check result: {regex_check}")
+        # Debugging: print the cleaned text
+        print(f"Cleaned message content: {text_without_links}")
 
-            # AI Check
-            ai_check = await self.analyze_with_gemini(text_without_links)
+        verdict, tier = await self.classify(text_without_links, prices)
 
-            # Debugging: print the AI check result
-            print(f"AI check result: {ai_check}")
+        # Debugging: print which tier settled the message
+        print(f"Price check result: {verdict} ({tier})")
 
-        # Check if either the regex or AI check flags the message
-        if regex_check or ai_check == "INVALID":
+        if verdict == "INVALID":
             # Log the invalid message
             mod_log_channel = self.bot.get_channel(MOD_LOG_CHANNEL_ID)
 
@@ -184,8 +188,8 @@ class WarningButton(View):
         user = await self.bot.fetch_user(self.user_id)
 
         # Fetch warnings
-        minor_warnings, major_warnings = get_warnings(user.id)
-        count = len(minor_warnings) + 1 if warning_type == "Minor Warning" else len(major_warnings) + 1
+        minor_count, major_count = await get_warning_counts(user.id)
+        count = minor_count + 1 if warning_type == "Minor Warning" else major_count + 1
 
         # Ask for automated/custom message
         await interaction.response.send_message(
@@ -194,7 +198,7 @@ class WarningButton(View):
             ephemeral=True
         )
 
-        add_mod_log(user.id, f"{warning_type} for pricing rule violation", interaction.user.id, warning_type.lower())
+        await add_mod_log(user.id, f"{warning_type} for pricing rule violation", interaction.user.id, warning_type.lower())
         for button in self.children:
             button.disabled = True  
 
@@ -254,7 +258,7 @@ class CustomMessageView(View):
         user_id = str(self.user.id)
         action_type = self.warning_type.lower().replace(" ", "_")  # Format: minor_warning, major_warning
         
-        success = add_mod_log(user_id, warning_text, moderator_id, action_type)
+        success = await add_mod_log(user_id, warning_text, moderator_id, action_type)
         if not success:
             print(f"⚠️ Failed to log warning for {user_id} in the database.")
 
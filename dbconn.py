@@ -1,140 +1,103 @@
-import mysql.connector
-from mysql.connector import Error
-import os
+from dbpool import DictCursor, Error, create_pool
 
-_connection = None
 
-def create_connection():
-    global _connection
+async def create_connection():
+    """Returns the shared connection pool, creating it on first use."""
+    return await create_pool()
 
-    # Use the same environment variables for printing and connecting
-    host = os.getenv('MOD_HOST', 'localhost')
-    port = int(os.getenv('MOD_PORT', 3306))
 
-    if _connection and _connection.is_connected():
-        return _connection
-
-    try:
-        _connection = mysql.connector.connect(
-            host=host,
-            port=port,
-            user=os.getenv('MOD_USER', 'root'),
-            password=os.getenv('MOD_PASSWORD', ''),
-            database=os.getenv('MOD_DATABASE', 'mod_logs')
-        )
-        print("✅ Database connection successful!")
-        return _connection
-    except Error as e:
-        print("❌ Error connecting to verification database:", e)
-        return None
-
-
-def create_table():
-    """Creates the 'user_data' table if it does not already exist."""
-    connection = create_connection()
-    if connection is None:
-        return
-    try:
-        cursor = connection.cursor()
-        create_table_query = """
-            CREATE TABLE IF NOT EXISTS user_data (
-                join_time DATETIME NOT NULL,
-                user_id VARCHAR(100) PRIMARY KEY,
-                password VARCHAR(100) NOT NULL
-            );
-
-        """
-        cursor.execute(create_table_query)
-        connection.commit()
-    except Error as e:
-        print("Error creating table:", e)
-    finally:
-        cursor.close()
-
-def add_user(user_id, join_time, password):
+async def add_user(user_id, join_time, password):
     """Adds a new user record to the 'user_data' table."""
-    connection = create_connection()
-    if connection is None:
-        return
+    pool = await create_connection()
+    if pool is None:
+        return False
     try:
-        cursor = connection.cursor()
-        insert_query = """
-        INSERT INTO user_data (user_id, join_time, password)
-        VALUES (%s, %s, %s);
-        """
-        cursor.execute(insert_query, (user_id, join_time, password))
-        connection.commit()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                insert_query = """
+                INSERT INTO user_data (user_id, join_time, password)
+                VALUES (%s, %s, %s);
+                """
+                await cursor.execute(insert_query, (user_id, join_time, password))
+        return True
     except Error as e:
         print("Error inserting new user:", e)
-    finally:
-        cursor.close()
+        return False
 
-def get_user_by_id(user_id):
+async def get_user_by_id(user_id):
     """Retrieves a user record based on user_id."""
-    connection = create_connection()
-    if connection is None:
+    pool = await create_connection()
+    if pool is None:
         return None
     try:
-        cursor = connection.cursor(dictionary=True)
-        select_query = "SELECT * FROM user_data WHERE user_id = %s;"
-        cursor.execute(select_query, (user_id,))
-        result = cursor.fetchone()
-        return result
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                select_query = "SELECT * FROM user_data WHERE user_id = %s;"
+                await cursor.execute(select_query, (user_id,))
+                return await cursor.fetchone()
     except Error as e:
         print("Error retrieving user:", e)
         return None
-    finally:
-        cursor.close()
 
-def get_password_by_user_id(user_id):
+async def get_password_by_user_id(user_id):
     """Returns the password of a user based on user_id."""
-    connection = create_connection()
-    if connection is None:
+    pool = await create_connection()
+    if pool is None:
         return None
     try:
-        cursor = connection.cursor(dictionary=True)  # Use dictionary=True for named access
-        select_query = "SELECT password FROM user_data WHERE user_id = %s;"
-        cursor.execute(select_query, (user_id,))
-        result = cursor.fetchone()
-        return result['password'] if result else None  # type: ignore # Access by column name
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:  # DictCursor for named access
+                select_query = "SELECT password FROM user_data WHERE user_id = %s;"
+                await cursor.execute(select_query, (user_id,))
+                result = await cursor.fetchone()
+                return result['password'] if result else None
     except Error as e:
         print("Error retrieving password:", e)
         return None
-    finally:
-        cursor.close()
 
-def get_join_time_by_user_id(user_id):
+async def get_join_time_by_user_id(user_id):
     """Returns the join time of a user based on user_id."""
-    connection = create_connection()
-    if connection is None:
+    pool = await create_connection()
+    if pool is None:
         return None
     try:
-        cursor = connection.cursor(dictionary=True)  # Use dictionary=True for named access
-        select_query = "SELECT join_time FROM user_data WHERE user_id = %s;"
-        cursor.execute(select_query, (user_id,))
-        result = cursor.fetchone()
-        return result['join_time'] if result else None  # type: ignore # Access by column name
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:  # DictCursor for named access
+                select_query = "SELECT join_time FROM user_data WHERE user_id = %s;"
+                await cursor.execute(select_query, (user_id,))
+                result = await cursor.fetchone()
+                return result['join_time'] if result else None
     except Error as e:
         print("Error retrieving join time:", e)
         return None
-    finally:
-        cursor.close()
 
 
-def check_user_exists(user_id):
-    connection = create_connection()
-    if connection is None:
+async def get_pending_users():
+    """Returns every user_data row (users who haven't verified yet), or None on error."""
+    pool = await create_connection()
+    if pool is None:
+        return None
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                await cursor.execute("SELECT user_id, join_time, password FROM user_data;")
+                return await cursor.fetchall()
+    except Error as e:
+        print("Error loading pending users:", e)
+        return None
+
+
+async def check_user_exists(user_id):
+    pool = await create_connection()
+    if pool is None:
         print("No connection could be established.")
         return False
 
     try:
-        cursor = connection.cursor()  # Fails if connection is None
-        cursor.execute("SELECT COUNT(*) FROM user_data WHERE user_id = %s", (user_id,))
-
-        result = cursor.fetchone()
-
-        # Ensure to close the cursor
-        cursor.close()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT COUNT(*) FROM user_data WHERE user_id = %s", (user_id,))
+                result = await cursor.fetchone()
 
         if result and result[0] > 0:
             return True
@@ -143,36 +106,54 @@ def check_user_exists(user_id):
     except Error as e:
         print(f"Error while checking user exists: {e}")
         return False
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
 
-def delete_user_by_id(user_id):
+async def delete_user_by_id(user_id):
     """Deletes a user from the user_data table based on user_id."""
-    connection = create_connection()
-    if connection is None:
-        return False  # Return False if the connection couldn't be created
+    pool = await create_connection()
+    if pool is None:
+        return False  # Return False if the pool couldn't be created
     try:
-        cursor = connection.cursor()
-        delete_query = "DELETE FROM user_data WHERE user_id = %s;"
-        cursor.execute(delete_query, (user_id,))
-        connection.commit()  # Commit the transaction to apply changes
-        print(f"User with ID {user_id} deleted successfully.")
-        return cursor.rowcount > 0  # Return True if a row was deleted
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                delete_query = "DELETE FROM user_data WHERE user_id = %s;"
+                await cursor.execute(delete_query, (user_id,))
+                print(f"User with ID {user_id} deleted successfully.")
+                return cursor.rowcount > 0  # Return True if a row was deleted
     except Error as e:
         print(f"Error deleting user with ID {user_id}: {e}")
         return False
-    finally:
-        cursor.close()
+
+async def delete_users_by_ids(user_ids, chunk_size=500):
+    """Deletes many users from user_data with one statement per chunk. Returns the number deleted."""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return 0
+    pool = await create_connection()
+    if pool is None:
+        return 0
+    deleted = 0
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                for start in range(0, len(user_ids), chunk_size):
+                    chunk = user_ids[start:start + chunk_size]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    await cursor.execute(f"DELETE FROM user_data WHERE user_id IN ({placeholders});", chunk)
+                    deleted += cursor.rowcount
+        return deleted
+    except Error as e:
+        print(f"Error deleting {len(user_ids)} users: {e}")
+        return deleted
 
 # Exportable functions
 __all__ = [
     "create_connection",
-    "create_table",
     "add_user",
     "get_user_by_id",
     "get_password_by_user_id",
     "get_join_time_by_user_id",
+    "get_pending_users",
     "check_user_exists",
-    "delete_user_by_id"
-]
\ No newline at end of file
+    "delete_user_by_id",
+    "delete_users_by_ids"
+]
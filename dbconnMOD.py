@@ -1,289 +1,972 @@
-import discord
-from discord.ext import commands
-from datetime import timedelta
-import mysql.connector
-from mysql.connector import Error   
-from discord.utils import utcnow
+import asyncio
 import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from discord.utils import utcnow
 
-_connection = None
-_connection_status_printed = False
+from dbpool import DB_ERRORS, DictCursor, Error, SSDictCursor, backend_name, create_pool, is_connection_error
 
-def create_connection():
-    global _connection, _connection_status_printed
 
-    if _connection and _connection.is_connected():
-        if not _connection_status_printed:
-            print("✅ Database connection successful!")
-            _connection_status_printed = True
-        return _connection
+async def create_connection():
+    """Returns the shared connection pool, creating it on first use."""
+    return await create_pool()
 
+
+async def get_notes(user_id):
+    """Retrieves all notes for a specific user as one block of text, oldest first."""
+    pool = await create_connection()
+    if pool is None:
+        return None
     try:
-        _connection = mysql.connector.connect(
-            host=os.getenv('MOD_HOST', 'localhost'),
-            port=int(os.getenv('MOD_PORT', 3306)),
-            user=os.getenv('MOD_USER', 'root'),
-            password=os.getenv('MOD_PASSWORD', ''),
-            database=os.getenv('MOD_DATABASE', 'mod_logs')
-        )
-        print("✅ Database connection successful!")
-        _connection_status_printed = True
-        return _connection
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                select_query = """
+                SELECT note FROM mod_notes WHERE user_id = %s ORDER BY note_id;
+                """
+                await cursor.execute(select_query, (user_id,))
+                result = await cursor.fetchall()
+                return "\n".join(row['note'] for row in result) if result else None
     except Error as e:
-        print("❌ Error connecting to database:", e)
-        _connection_status_printed = True
+        print(f"Error retrieving notes: {e}")
         return None
 
-
-def create_mod_log_table():
-    """Ensures the mod_logs table exists with the necessary columns."""
-    connection = create_connection()
-    if connection is None:
-        return
+async def has_notes(user_id):
+    """Checks whether a user has any notes without loading them."""
+    pool = await create_connection()
+    if pool is None:
+        return False
     try:
-        cursor = connection.cursor()
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS mod_logs (
-            log_id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id VARCHAR(100) NOT NULL,
-            reason TEXT NOT NULL,
-            moderator_id VARCHAR(100) NOT NULL,
-            action_type VARCHAR(100) NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT DEFAULT NULL  -- Added Notes column
-        );
-        """
-        cursor.execute(create_table_query)
-        connection.commit()
-        print("Mod log table is ready or already exists.")
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT 1 FROM mod_notes WHERE user_id = %s LIMIT 1;", (user_id,))
+                return bool(await cursor.fetchone())
     except Error as e:
-        print("Error creating mod_logs table:", e)
-    finally:
-        cursor.close()
-        
-def get_notes(user_id):
-    """Retrieves notes for a specific user."""
-    connection = create_connection()
-    if connection is None:
-        return None
+        print(f"Error checking notes: {e}")
+        return False
+
+async def get_notes_page(user_id, before_id=None, limit=5):
+    """Returns up to `limit` notes for a user, newest first, older than note `before_id`.
+
+    Returns (notes, has_more). Pass the last note_id of a page as `before_id`
+    to get the next one.
+    """
+    pool = await create_connection()
+    if pool is None:
+        return [], False
     try:
-        cursor = connection.cursor(dictionary=True)
-        select_query = """
-        SELECT notes FROM mod_logs WHERE user_id = %s;
-        """
-        cursor.execute(select_query, (user_id,))
-        result = cursor.fetchone()
-        return result['notes'] if result else None
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                if before_id is None:
+                    select_query = """
+                    SELECT note_id, moderator_id, note, created_at FROM mod_notes
+                    WHERE user_id = %s
+                    ORDER BY note_id DESC LIMIT %s;
+                    """
+                    params = (user_id, limit + 1)
+                else:
+                    select_query = """
+                    SELECT note_id, moderator_id, note, created_at FROM mod_notes
+                    WHERE user_id = %s AND note_id < %s
+                    ORDER BY note_id DESC LIMIT %s;
+                    """
+                    params = (user_id, before_id, limit + 1)
+                await cursor.execute(select_query, params)
+                rows = await cursor.fetchall()
+                return list(rows[:limit]), len(rows) > limit
     except Error as e:
-        print(f"Error retrieving notes: {e}")
-        return None
-    finally:
-        cursor.close()
+        print(f"Error retrieving notes page: {e}")
+        return [], False
 
-def add_note_to_db(user_id: int, note: str):
-    """Adds a note to a user in the mod_logs table."""
-    connection = create_connection()
-    if connection is None:
+async def add_note_to_db(user_id: int, note: str, moderator_id: int = None):
+    """Appends a note for a user to the mod_notes table."""
+    pool = await create_connection()
+    if pool is None:
         return False
     try:
-        cursor = connection.cursor()
-        update_query = """
-        UPDATE mod_logs SET notes = CONCAT(COALESCE(notes, ''), %s) WHERE user_id = %s;
-        """
-        cursor.execute(update_query, (f'\n{note}', user_id))
-        connection.commit()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                insert_query = """
+                INSERT INTO mod_notes (user_id, moderator_id, note)
+                VALUES (%s, %s, %s);
+                """
+                await cursor.execute(insert_query, (str(user_id), str(moderator_id) if moderator_id else None, note))
         print(f"Note added for user {user_id}.")
         return True
     except Error as e:
         print(f"Error adding note: {e}")
         return False
-    finally:
-        cursor.close()
-        
-def add_mod_log(user_id, reason, moderator_id, action_type):
-    """Adds a new moderation log to the 'mod_logs' table."""
-    connection = create_connection()
-    if connection is None:
-        print("No connection to database. Cannot insert log.")
-        return False
-    try:
-        cursor = connection.cursor()
-        timestamp = utcnow().strftime('%Y-%m-%d %H:%M:%S')  # Get the current UTC timestamp
-        insert_query = """
-        INSERT INTO mod_logs (user_id, reason, moderator_id, action_type, timestamp)
-        VALUES (%s, %s, %s, %s, %s);
+
+WARNING_COLUMNS = {"minor_warning": "minor_count", "major_warning": "major_count"}
+
+
+def _summary_deltas(rows):
+    """Collapses mod log rows into one (user_id, minor, major, last_action, last_timestamp) per user."""
+    totals = {}
+    for user_id, reason, moderator_id, action_type, timestamp in rows:
+        entry = totals.setdefault(user_id, [0, 0, action_type, timestamp])
+        column = WARNING_COLUMNS.get(action_type.lower())
+        if column == "minor_count":
+            entry[0] += 1
+        elif column == "major_count":
+            entry[1] += 1
+        if timestamp >= entry[3]:
+            entry[2], entry[3] = action_type, timestamp
+    return [(user_id, *entry) for user_id, entry in totals.items()]
+
+
+def _activity_deltas(rows):
+    """Collapses mod log rows into one (day, moderator_id, action_type, count) per rollup key."""
+    counts = {}
+    for user_id, reason, moderator_id, action_type, timestamp in rows:
+        key = (timestamp[:10], moderator_id, action_type)
+        counts[key] = counts.get(key, 0) + 1
+    return [(*key, count) for key, count in counts.items()]
+
+
+class SummaryCache:
+    """Small LRU of mod_user_summary rows.
+
+    Entries always mirror the database row; rows still sitting in the write
+    queue are added on top at read time. The TTL bounds how stale a count can
+    get when the other bot process logs an action for the same user.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()  # user_id -> generation of its latest invalidate()
+        self._generation = 0
+        self._floor = 0  # Newest generation dropped from _versions
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def version(self, user_id):
+        """Returns a token that changes every time user_id is invalidated."""
+        return self._versions.get(user_id, self._floor)
+
+    def put(self, user_id, summary, version=None):
+        """Caches a summary read from the database.
+
+        Pass the version() taken before the read: if a write for the user
+        committed in the meantime the summary is already stale and is dropped.
         """
-        cursor.execute(insert_query, (user_id, reason, moderator_id, action_type, timestamp))
-        connection.commit()
-        print(f"Log added for user {user_id} with action_type {action_type}.")
+        if version is not None and version != self.version(user_id):
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, summary)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+        self._generation += 1
+        self._versions[user_id] = self._generation
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_entries:
+            # Raising the floor changes version() for every user without an entry, so no fill started earlier can land
+            self._floor = self._versions.popitem(last=False)[1]
+
+
+_summary_cache = SummaryCache(
+    ttl=float(os.getenv('SUMMARY_CACHE_TTL', 30)),
+    max_entries=int(os.getenv('SUMMARY_CACHE_SIZE', 5000))
+)
+
+
+class ModLogWriter:
+    """Write-behind queue for mod log rows.
+
+    add_mod_log() only appends to an in-memory buffer; a background task
+    writes the buffer with one multi-row INSERT per transaction once
+    `batch_size` rows are waiting or `flush_interval` seconds have passed.
+    Rows stay buffered while the database is unreachable and are written
+    on the next successful flush or on shutdown.
+    """
+
+    INSERT_QUERY = """
+    INSERT INTO mod_logs (user_id, reason, moderator_id, action_type, timestamp)
+    VALUES (%s, %s, %s, %s, %s);
+    """
+
+    ACTIVITY_QUERY = """
+    INSERT INTO mod_activity_daily (day, moderator_id, action_type, action_count)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE action_count = action_count + VALUES(action_count);
+    """
+
+    # Assignments run left to right, so last_action still compares against the old last_timestamp
+    SUMMARY_QUERY = """
+    INSERT INTO mod_user_summary (user_id, minor_count, major_count, last_action, last_timestamp)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        minor_count = minor_count + VALUES(minor_count),
+        major_count = major_count + VALUES(major_count),
+        last_action = IF(last_timestamp IS NULL OR VALUES(last_timestamp) >= last_timestamp, VALUES(last_action), last_action),
+        last_timestamp = GREATEST(COALESCE(last_timestamp, VALUES(last_timestamp)), VALUES(last_timestamp));
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=20000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.inflight = []  # Rows taken from `pending` whose transaction hasn't committed yet
+        self.written = 0
+        self._lock = None
+        self._wake = None
+        self._task = None
+        self._closing = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._lock = self._lock or asyncio.Lock()
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, row):
+        """Buffers one row. Returns False if the buffer is full."""
+        if len(self.pending) >= self.max_pending:
+            return False
+        self.start()
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self._wake.set()
         return True
-    except Error as e:
-        print(f"Error inserting moderation log: {e}")
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.pending:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"Unexpected error flushing mod logs: {e}")
+
+    async def flush(self):
+        """Writes everything buffered so far. Returns True if the buffer is empty afterwards."""
+        self._lock = self._lock or asyncio.Lock()
+        async with self._lock:
+            if not self.pending:
+                return True
+            pool = await create_connection()
+            if pool is None:
+                return False
+
+            batch, self.pending = self.pending, []
+            self.inflight = batch
+            try:
+                await self._write(pool, batch)
+            except DB_ERRORS as e:
+                if is_connection_error(e):
+                    # Keep the rows for the next attempt, ahead of anything queued meanwhile
+                    self.inflight = []
+                    self.pending = batch + self.pending
+                    print(f"Mod log flush failed, {len(self.pending)} rows kept for retry: {e}")
+                    return False
+                # One bad row shouldn't lose the whole batch
+                print(f"Batched mod log insert failed ({e}), retrying rows one at a time.")
+                for index, row in enumerate(batch):
+                    try:
+                        await self._write(pool, [row])
+                    except DB_ERRORS as row_error:
+                        if is_connection_error(row_error):
+                            # The connection went away mid-fallback; requeue what hasn't been written
+                            self.pending = batch[index:] + self.pending
+                            print(f"Mod log flush failed, {len(self.pending)} rows kept for retry: {row_error}")
+                            return False
+                        self._settle([row])
+                        print(f"Error inserting moderation log {row}: {row_error}")
+            finally:
+                self.inflight = []
+            return not self.pending
+
+    async def _write(self, pool, rows):
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await _insert_log_rows(cursor, rows)
+                await conn.commit()
+            except Error:
+                await conn.rollback()
+                raise
+            # Committed rows are read from the database now, so stop adding them on top
+            self._settle(rows)
+            for user_id in {row[0] for row in rows}:
+                _summary_cache.invalidate(user_id)
+        self.written += len(rows)
+
+    def _settle(self, rows):
+        """Drops rows that are committed or given up on from `inflight`."""
+        settled = {id(row) for row in rows}
+        self.inflight = [row for row in self.inflight if id(row) not in settled]
+
+    async def stop(self):
+        """Stops the background task and writes whatever is still buffered."""
+        self._closing = True
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+            self._task = None
+        return await self.flush()
+
+
+async def _insert_log_rows(cursor, rows):
+    """Inserts mod log rows and folds them into mod_user_summary and mod_activity_daily.
+
+    Runs inside the caller's transaction.
+    """
+    await cursor.executemany(ModLogWriter.INSERT_QUERY, rows)
+    await cursor.executemany(ModLogWriter.SUMMARY_QUERY, _summary_deltas(rows))
+    await cursor.executemany(ModLogWriter.ACTIVITY_QUERY, _activity_deltas(rows))
+
+
+_writer = ModLogWriter(
+    batch_size=int(os.getenv('MODLOG_BATCH_SIZE', 100)),
+    flush_interval=float(os.getenv('MODLOG_FLUSH_INTERVAL', 2.0))
+)
+
+
+async def _read_barrier():
+    """Flushes buffered log rows so reads see actions that were just logged."""
+    if _writer.pending:
+        await _writer.flush()
+
+
+async def flush_mod_logs():
+    """Stops the write-behind queue and writes any buffered rows. Call on shutdown.
+
+    Returns True if nothing is left buffered.
+    """
+    return await _writer.stop()
+
+
+async def add_mod_log(user_id, reason, moderator_id, action_type):
+    """Queues a new moderation log for the 'mod_logs' table.
+
+    Returns as soon as the row is buffered; the insert happens in the next batch.
+    """
+    timestamp = utcnow().strftime('%Y-%m-%d %H:%M:%S')  # Get the current UTC timestamp
+    if not _writer.enqueue((str(user_id), reason, str(moderator_id), action_type, timestamp)):
+        print(f"Mod log queue is full. Dropping log for user {user_id} with action_type {action_type}.")
         return False
-    finally:
-        cursor.close()
+    return True
 
+async def get_import_checkpoint(source):
+    """Returns how many records of import `source` have been committed, or 0."""
+    pool = await create_connection()
+    if pool is None:
+        return None
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT records_done FROM import_checkpoints WHERE source = %s;", (source,))
+                result = await cursor.fetchone()
+                return result[0] if result else 0
+    except Error as e:
+        print(f"Error reading import checkpoint: {e}")
+        return None
 
+async def _write_logs_with_marker(rows, marker_query, marker_params):
+    """Inserts mod log rows and runs `marker_query` (a progress marker) in one transaction."""
+    pool = await create_connection()
+    if pool is None:
+        return False
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cursor:
+                if rows:
+                    await _insert_log_rows(cursor, rows)
+                await cursor.execute(marker_query, marker_params)
+            await conn.commit()
+        except Error:
+            await conn.rollback()
+            raise
+    for user_id in {row[0] for row in rows}:
+        _summary_cache.invalidate(user_id)
+    return True
 
-def add_action_column():
-    """Adds the 'action_type' column to the 'mod_logs' table if it doesn't exist."""
-    connection = create_connection()
-    if connection is None:
-        return
+async def import_mod_logs_batch(rows, source, records_done):
+    """Writes one batch of imported mod log rows, bypassing the write-behind queue.
+
+    The checkpoint for `source` is saved in the same transaction, so a resumed
+    import never writes a batch twice. Returns True on success.
+    """
     try:
-        cursor = connection.cursor()
-        # Adding the 'action_type' column if it does not exist
-        alter_table_query = """
-        ALTER TABLE mod_logs
-        ADD COLUMN action_type VARCHAR(100) NOT NULL DEFAULT 'unknown';
-        """
-        cursor.execute(alter_table_query)
-        connection.commit()
+        return await _write_logs_with_marker(
+            rows,
+            """
+            INSERT INTO import_checkpoints (source, records_done) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE records_done = VALUES(records_done), updated_at = CURRENT_TIMESTAMP;
+            """,
+            (source, records_done)
+        )
     except Error as e:
-        print("Error adding 'action_type' column:", e)
-    finally:
-        cursor.close()
-        connection.close()
+        print(f"Error importing mod log batch: {e}")
+        return False
 
+async def get_audit_log_cursor(guild_id):
+    """Returns the id of the last audit log entry ingested for a guild, 0 if none, or None on error."""
+    pool = await create_connection()
+    if pool is None:
+        return None
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT last_entry_id FROM audit_log_cursor WHERE guild_id = %s;", (str(guild_id),))
+                result = await cursor.fetchone()
+                return int(result[0]) if result else 0
+    except Error as e:
+        print(f"Error reading audit log cursor: {e}")
+        return None
 
+async def ingest_audit_log_batch(rows, guild_id, last_entry_id):
+    """Writes mod log rows taken from the audit log and advances the guild's cursor with them.
 
+    Both happen in one transaction, so an entry is never logged twice even if
+    the bot dies between batches. Returns True on success.
+    """
+    try:
+        return await _write_logs_with_marker(
+            rows,
+            """
+            INSERT INTO audit_log_cursor (guild_id, last_entry_id) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE last_entry_id = VALUES(last_entry_id), updated_at = CURRENT_TIMESTAMP;
+            """,
+            (str(guild_id), last_entry_id)
+        )
+    except Error as e:
+        print(f"Error ingesting audit log batch: {e}")
+        return False
 
-def get_mod_logs_by_user(user_id):
-    """Retrieves all moderation logs for a specific user."""
-    connection = create_connection()
-    if connection is None:
+async def _load_summary(user_id):
+    cached = _summary_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = _summary_cache.version(user_id)
+    pool = await create_connection()
+    if pool is None:
         return None
     try:
-        cursor = connection.cursor(dictionary=True)
-        select_query = "SELECT * FROM mod_logs WHERE user_id = %s ORDER BY timestamp DESC;"
-        cursor.execute(select_query, (user_id,))
-        result = cursor.fetchall()
-        return result
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                select_query = """
+                SELECT minor_count, major_count, last_action, last_timestamp
+                FROM mod_user_summary WHERE user_id = %s;
+                """
+                await cursor.execute(select_query, (user_id,))
+                result = await cursor.fetchone()
     except Error as e:
-        print("Error retrieving mod logs:", e)
+        print(f"Error retrieving moderation summary: {e}")
         return None
-    finally:
-        cursor.close()
-        connection.close()
-
-def get_mod_logs_by_moderator(moderator_id):
-    """Retrieves all moderation logs issued by a specific moderator."""
-    connection = create_connection()
-    if connection is None:
+    summary = dict(result) if result else {"minor_count": 0, "major_count": 0, "last_action": None, "last_timestamp": None}
+    _summary_cache.put(user_id, summary, version)
+    return summary
+
+async def get_user_summary(user_id):
+    """Returns a user's warning counts and latest action from the summary table.
+
+    One primary-key lookup (or a cache hit) regardless of how long the user's
+    history is. Actions still waiting in the write queue are included.
+    """
+    user_id = str(user_id)
+    summary = dict(await _load_summary(user_id) or {"minor_count": 0, "major_count": 0, "last_action": None, "last_timestamp": None})
+    for row_user_id, reason, moderator_id, action_type, timestamp in _writer.inflight + _writer.pending:
+        if row_user_id != user_id:
+            continue
+        column = WARNING_COLUMNS.get(action_type.lower())
+        if column:
+            summary[column] += 1
+        timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+        if summary["last_timestamp"] is None or timestamp >= summary["last_timestamp"]:
+            summary["last_action"], summary["last_timestamp"] = action_type, timestamp
+    return summary
+
+async def get_warning_counts(user_id):
+    """Returns (minor_count, major_count) for a user."""
+    summary = await get_user_summary(user_id)
+    return summary["minor_count"], summary["major_count"]
+
+def summary_cache_stats():
+    """Returns hit/miss counters for the summary cache."""
+    return {"hits": _summary_cache.hits, "misses": _summary_cache.misses, "size": len(_summary_cache._entries)}
+
+async def get_mod_logs_page(user_id=None, moderator_id=None, action_types=None, cursor=None, limit=10, include_archived=False):
+    """Returns one page of mod logs, newest first, using keyset pagination.
+
+    Filters on user_id and/or moderator_id and optionally a list of action
+    types. `cursor` is the (timestamp, log_id) of the last row on the previous
+    page, so each call only reads the rows it returns no matter how deep the
+    page is. Returns (rows, next_cursor); next_cursor is None on the last page.
+    With include_archived, rows from mod_logs_archive are merged in and carry
+    `archived = 1`.
+    """
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
+        return [], None
+
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(str(user_id))
+    if moderator_id is not None:
+        conditions.append("moderator_id = %s")
+        params.append(str(moderator_id))
+    if action_types:
+        conditions.append(f"action_type IN ({', '.join(['%s'] * len(action_types))})")
+        params.extend(action_types)
+    if cursor is not None:
+        conditions.append("(timestamp < %s OR (timestamp = %s AND log_id < %s))")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    where = " AND ".join(conditions) if conditions else "1 = 1"
+
+    columns = "log_id, user_id, reason, moderator_id, action_type, timestamp"
+    if include_archived:
+        # Each branch is limited on its own so both can use their (user/moderator, timestamp) index
+        select_query = f"""
+        SELECT * FROM (
+            SELECT * FROM (
+                SELECT {columns}, 0 AS archived FROM mod_logs WHERE {where}
+                ORDER BY timestamp DESC, log_id DESC LIMIT %s
+            ) AS live
+            UNION ALL
+            SELECT * FROM (
+                SELECT {columns}, 1 AS archived FROM mod_logs_archive WHERE {where}
+                ORDER BY timestamp DESC, log_id DESC LIMIT %s
+            ) AS expired
+        ) AS logs
+        ORDER BY timestamp DESC, log_id DESC
+        LIMIT %s;
+        """
+        params = (*params, limit + 1, *params, limit + 1, limit + 1)
+    else:
+        select_query = f"""
+        SELECT {columns}, 0 AS archived
+        FROM mod_logs
+        WHERE {where}
+        ORDER BY timestamp DESC, log_id DESC
+        LIMIT %s;
+        """
+        params = (*params, limit + 1)
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as db_cursor:
+                await db_cursor.execute(select_query, params)
+                rows = list(await db_cursor.fetchall())
+    except Error as e:
+        print("Error retrieving mod log page:", e)
+        return [], None
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["timestamp"], rows[-1]["log_id"])
+    return rows, next_cursor
+
+async def iter_mod_logs(since=None, until=None, action_types=None, moderator_id=None, user_id=None, batch_size=1000,
+                        include_archived=True):
+    """Streams matching mod logs in log_id order, yielding lists of at most batch_size rows.
+
+    Uses an unbuffered server-side cursor, so only one batch is held in memory
+    at a time however many rows match. `since` is inclusive and `until` is
+    exclusive. Warnings moved to mod_logs_archive by the retention task are
+    included (with archived = 1) unless `include_archived` is False. The
+    connection stays checked out until the generator finishes or is closed,
+    so consume it promptly.
+    """
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
+        return
+
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("timestamp >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("timestamp < %s")
+        params.append(until)
+    if action_types:
+        conditions.append(f"action_type IN ({', '.join(['%s'] * len(action_types))})")
+        params.extend(action_types)
+    if moderator_id is not None:
+        conditions.append("moderator_id = %s")
+        params.append(str(moderator_id))
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(str(user_id))
+    where = " AND ".join(conditions) if conditions else "1 = 1"
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(SSDictCursor) as cursor:
+                columns = "log_id, user_id, reason, moderator_id, action_type, timestamp"
+                select_query = f"SELECT {columns}, 0 AS archived FROM mod_logs WHERE {where} ORDER BY log_id;"
+                if include_archived:
+                    # Archived rows keep their log_id, so one ORDER BY interleaves both tables
+                    select_query = f"""
+                    SELECT * FROM (SELECT {columns}, 0 AS archived FROM mod_logs WHERE {where}) AS live_logs
+                    UNION ALL
+                    SELECT * FROM (SELECT {columns}, 1 AS archived FROM mod_logs_archive WHERE {where}) AS archived_logs
+                    ORDER BY log_id;
+                    """
+                    params = params * 2
+                await cursor.execute(select_query, params)
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+    except Error as e:
+        print("Error streaming mod logs:", e)
+        raise
+
+_SEARCH_QUERY_MYSQL = """
+SELECT * FROM (
+    SELECT 'log' AS source, log_id AS record_id, user_id, moderator_id, action_type,
+           reason AS text, timestamp, 0 AS archived, MATCH(reason) AGAINST (%s) AS score
+    FROM mod_logs WHERE MATCH(reason) AGAINST (%s)
+    UNION ALL
+    SELECT 'log', log_id, user_id, moderator_id, action_type,
+           reason, timestamp, 1, MATCH(reason) AGAINST (%s)
+    FROM mod_logs_archive WHERE MATCH(reason) AGAINST (%s)
+    UNION ALL
+    SELECT 'note', note_id, user_id, moderator_id, 'note',
+           note, created_at, 0, MATCH(note) AGAINST (%s)
+    FROM mod_notes WHERE MATCH(note) AGAINST (%s)
+) AS hits
+ORDER BY score DESC, timestamp DESC
+LIMIT %s OFFSET %s;
+"""
+
+# bm25() is lower for better matches, so it is negated to sort the same way as MySQL's relevance
+_SEARCH_QUERY_SQLITE = """
+SELECT * FROM (
+    SELECT 'log' AS source, l.log_id AS record_id, l.user_id, l.moderator_id, l.action_type,
+           l.reason AS text, l.timestamp, 0 AS archived, -bm25(mod_logs_fts) AS score
+    FROM mod_logs_fts JOIN mod_logs l ON l.log_id = mod_logs_fts.rowid
+    WHERE mod_logs_fts MATCH %s
+    UNION ALL
+    SELECT 'log', a.log_id, a.user_id, a.moderator_id, a.action_type,
+           a.reason, a.timestamp, 1, -bm25(mod_logs_archive_fts)
+    FROM mod_logs_archive_fts JOIN mod_logs_archive a ON a.log_id = mod_logs_archive_fts.rowid
+    WHERE mod_logs_archive_fts MATCH %s
+    UNION ALL
+    SELECT 'note', n.note_id, n.user_id, n.moderator_id, 'note',
+           n.note, n.created_at, 0, -bm25(mod_notes_fts)
+    FROM mod_notes_fts JOIN mod_notes n ON n.note_id = mod_notes_fts.rowid
+    WHERE mod_notes_fts MATCH %s
+) AS hits
+ORDER BY score DESC, timestamp DESC
+LIMIT %s OFFSET %s;
+"""
+
+async def search_mod_records(terms, offset=0, limit=10):
+    """Full-text search over mod log reasons and notes, best matches first.
+
+    Any of the words in `terms` can match, and archived warnings are searched
+    too. Returns (hits, has_more); each hit has source ('log' or 'note'),
+    record_id, user_id, moderator_id, action_type, text, timestamp, archived
+    and score.
+    """
+    words = re.findall(r"\w+", terms)
+    if not words:
+        return [], False
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
+        return [], False
+
+    if backend_name() == "sqlite":
+        # Quote each word so FTS5 never reads user input as query syntax
+        match = " OR ".join(f'"{word}"' for word in words)
+        query, params = _SEARCH_QUERY_SQLITE, (match, match, match, limit + 1, offset)
+    else:
+        match = " ".join(words)
+        query, params = _SEARCH_QUERY_MYSQL, (match,) * 6 + (limit + 1, offset)
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                await cursor.execute(query, params)
+                rows = await cursor.fetchall()
+                return list(rows[:limit]), len(rows) > limit
+    except Error as e:
+        print(f"Error searching mod logs: {e}")
+        return [], False
+
+async def get_activity_rollup(since, moderator_id=None):
+    """Returns (day, moderator_id, action_type, action_count) rollup rows from `since` (a date) onwards.
+
+    Reads only mod_activity_daily, never mod_logs.
+    """
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
         return None
+    conditions, params = ["day >= %s"], [since]
+    if moderator_id is not None:
+        conditions.append("moderator_id = %s")
+        params.append(str(moderator_id))
     try:
-        cursor = connection.cursor(dictionary=True)
-        select_query = "SELECT * FROM mod_logs WHERE moderator_id = %s ORDER BY timestamp DESC;"
-        cursor.execute(select_query, (moderator_id,))
-        result = cursor.fetchall()
-        return result
+        async with pool.acquire() as conn:
+            async with conn.cursor(DictCursor) as cursor:
+                select_query = f"""
+                SELECT day, moderator_id, action_type, action_count
+                FROM mod_activity_daily
+                WHERE {" AND ".join(conditions)} AND action_count > 0
+                ORDER BY day;
+                """
+                await cursor.execute(select_query, params)
+                return await cursor.fetchall()
     except Error as e:
-        print("Error retrieving logs by moderator:", e)
+        print(f"Error retrieving moderator activity: {e}")
         return None
-    finally:
-        cursor.close()
-        connection.close()
 
-def check_log_exists(log_id):
+async def reaggregate_activity(since=None):
+    """Rebuilds mod_activity_daily from mod_logs and mod_logs_archive for days from `since` on.
+
+    Corrects any drift in the incremental counts. `since=None` rebuilds
+    everything. Returns True on success.
+    """
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
+        return False
+    day_filter, params = ("WHERE timestamp >= %s", [since, since]) if since is not None else ("", [])
+    try:
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    if since is not None:
+                        await cursor.execute("DELETE FROM mod_activity_daily WHERE day >= %s;", (since,))
+                    else:
+                        await cursor.execute("DELETE FROM mod_activity_daily;")
+                    await cursor.execute(
+                        f"""
+                        INSERT INTO mod_activity_daily (day, moderator_id, action_type, action_count)
+                        SELECT DATE(timestamp), moderator_id, action_type, COUNT(*)
+                        FROM (
+                            SELECT moderator_id, action_type, timestamp FROM mod_logs {day_filter}
+                            UNION ALL
+                            SELECT moderator_id, action_type, timestamp FROM mod_logs_archive {day_filter}
+                        ) AS logs
+                        WHERE timestamp IS NOT NULL
+                        GROUP BY DATE(timestamp), moderator_id, action_type;
+                        """,
+                        params
+                    )
+                await conn.commit()
+            except Error:
+                await conn.rollback()
+                raise
+        return True
+    except Error as e:
+        print(f"Error re-aggregating moderator activity: {e}")
+        return False
+
+async def check_log_exists(log_id):
     """Checks if a specific moderation log exists based on log_id."""
-    connection = create_connection()
-    if connection is None:
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
         return False
     try:
-        cursor = connection.cursor()
-        select_query = "SELECT 1 FROM mod_logs WHERE log_id = %s;"
-        cursor.execute(select_query, (log_id,))
-        result = cursor.fetchone()
-        return bool(result)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                select_query = "SELECT 1 FROM mod_logs WHERE log_id = %s;"
+                await cursor.execute(select_query, (log_id,))
+                result = await cursor.fetchone()
+                return bool(result)
     except Error as e:
         print("Error checking if log exists:", e)
         return False
-    finally:
-        cursor.close()
-        connection.close()
 
-def delete_mod_log_by_id(log_id):
+async def delete_mod_log_by_id(log_id):
     """Deletes a moderation log from the database based on log_id."""
-    connection = create_connection()
-    if connection is None:
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
         return False
     try:
-        cursor = connection.cursor()
-        delete_query = "DELETE FROM mod_logs WHERE log_id = %s;"
-        cursor.execute(delete_query, (log_id,))
-        connection.commit()
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT user_id, action_type, moderator_id, timestamp FROM mod_logs WHERE log_id = %s FOR UPDATE;",
+                        (log_id,)
+                    )
+                    row = await cursor.fetchone()
+                    if row is None:
+                        await conn.rollback()
+                        return False
+                    await cursor.execute("DELETE FROM mod_logs WHERE log_id = %s;", (log_id,))
+                    await _decrement_summary(cursor, row[0], row[1])
+                    await _decrement_activity(cursor, row[2], row[1], row[3])
+                await conn.commit()
+            except Error:
+                await conn.rollback()
+                raise
+        _summary_cache.invalidate(row[0])
         print(f"Log with ID {log_id} deleted successfully.")
-        return cursor.rowcount > 0
+        return True
     except Error as e:
         print(f"Error deleting log with ID {log_id}: {e}")
         return False
-    finally:
-        cursor.close()
-        connection.close()
-        
-def get_warnings(user_id):
-    """Fetches minor and major warnings for a user from DB."""
-    connection = create_connection()
-    if connection is None:
-        return [], []
-    
-    try:
-        cursor = connection.cursor(dictionary=True)
-        query = """
-        SELECT log_id, action_type, reason, moderator_id AS mod_id, timestamp AS date 
-        FROM mod_logs 
-        WHERE user_id = %s;
+
+async def _decrement_summary(cursor, user_id, action_type, amount=1):
+    column = WARNING_COLUMNS.get(action_type.lower())
+    if column:
+        await cursor.execute(
+            f"UPDATE mod_user_summary SET {column} = GREATEST({column} - %s, 0) WHERE user_id = %s;",
+            (amount, user_id)
+        )
+
+async def _decrement_activity(cursor, moderator_id, action_type, timestamp):
+    await cursor.execute(
         """
-        cursor.execute(query, (user_id,))
-        logs = cursor.fetchall()
-        
-        minor_warnings = [log for log in logs if log["action_type"].lower() == "minor_warning"]
-        major_warnings = [log for log in logs if log["action_type"].lower() == "major_warning"]
+        UPDATE mod_activity_daily SET action_count = GREATEST(action_count - 1, 0)
+        WHERE day = DATE(%s) AND moderator_id = %s AND action_type = %s;
+        """,
+        (timestamp, moderator_id, action_type)
+    )
 
-        return minor_warnings, major_warnings
+async def archive_expired_logs(action_type, older_than, batch_size=500):
+    """Moves one batch of `action_type` logs older than `older_than` into mod_logs_archive.
+
+    Copy, delete and the summary decrement happen in one transaction, so a
+    crash never leaves a row counted twice or lost. Returns the number of
+    rows archived; call again until it returns 0.
+    """
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
+        return 0
+    try:
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        SELECT log_id, user_id FROM mod_logs
+                        WHERE action_type = %s AND timestamp < %s
+                        ORDER BY timestamp, log_id
+                        LIMIT %s FOR UPDATE;
+                        """,
+                        (action_type, older_than, batch_size)
+                    )
+                    rows = await cursor.fetchall()
+                    if not rows:
+                        await conn.rollback()
+                        return 0
+                    log_ids = [row[0] for row in rows]
+                    placeholders = ", ".join(["%s"] * len(log_ids))
+                    await cursor.execute(
+                        f"""
+                        INSERT INTO mod_logs_archive (log_id, user_id, reason, moderator_id, action_type, timestamp)
+                        SELECT log_id, user_id, reason, moderator_id, action_type, timestamp
+                        FROM mod_logs WHERE log_id IN ({placeholders});
+                        """,
+                        log_ids
+                    )
+                    await cursor.execute(f"DELETE FROM mod_logs WHERE log_id IN ({placeholders});", log_ids)
+                    per_user = {}
+                    for log_id, user_id in rows:
+                        per_user[user_id] = per_user.get(user_id, 0) + 1
+                    for user_id, amount in per_user.items():
+                        await _decrement_summary(cursor, user_id, action_type, amount)
+                await conn.commit()
+            except Error:
+                await conn.rollback()
+                raise
+        for user_id in per_user:
+            _summary_cache.invalidate(user_id)
+        return len(rows)
     except Error as e:
-        print(f"Error retrieving warnings: {e}")
-        return [], []
-    finally:
-        cursor.close()
-        connection.close()
-
-        
-def remove_warning(user_id, action_type, log_id):
+        print(f"Error archiving {action_type} logs: {e}")
+        return 0
+
+async def remove_warning(user_id, action_type, log_id):
     """Removes a warning from the database."""
-    connection = create_connection()
-    if connection is None:
+    await _read_barrier()
+    pool = await create_connection()
+    if pool is None:
         return False
+    action_type = f"{action_type}_warning"  # Ensure correct action type format
     try:
-        cursor = connection.cursor()
-        delete_query = """
-        DELETE FROM mod_logs 
-        WHERE user_id = %s AND action_type = %s AND log_id = %s 
-        LIMIT 1;
-        """
-        action_type = f"{action_type}_warning"  # Ensure correct action type format
-        cursor.execute(delete_query, (user_id, action_type, log_id))
-        connection.commit()
-        return cursor.rowcount > 0  # Returns True if deletion was successful
+        async with pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    select_query = """
+                    SELECT moderator_id, timestamp FROM mod_logs
+                    WHERE user_id = %s AND action_type = %s AND log_id = %s
+                    FOR UPDATE;
+                    """
+                    await cursor.execute(select_query, (user_id, action_type, log_id))
+                    row = await cursor.fetchone()
+                    removed = row is not None
+                    if removed:
+                        await cursor.execute("DELETE FROM mod_logs WHERE log_id = %s;", (log_id,))
+                        await _decrement_summary(cursor, user_id, action_type)
+                        await _decrement_activity(cursor, row[0], action_type, row[1])
+                await conn.commit()
+            except Error:
+                await conn.rollback()
+                raise
+        _summary_cache.invalidate(str(user_id))
+        return removed
     except Error as e:
         print(f"Error removing warning: {e}")
         return False
-    finally:
-        cursor.close()
-        connection.close()
-        
+
 
 __all__ = [
     "create_connection",
-    "create_mod_log_table",
     "add_mod_log",
-    "get_mod_logs_by_user",
-    "get_mod_logs_by_moderator",
+    "flush_mod_logs",
+    "get_import_checkpoint",
+    "import_mod_logs_batch",
+    "get_audit_log_cursor",
+    "ingest_audit_log_batch",
+    "get_mod_logs_page",
+    "archive_expired_logs",
+    "iter_mod_logs",
+    "search_mod_records",
+    "get_activity_rollup",
+    "reaggregate_activity",
     "check_log_exists",
     "delete_mod_log_by_id",
-    "get_warnings",
-    "create_connection",
+    "get_user_summary",
+    "get_warning_counts",
+    "summary_cache_stats",
+    "remove_warning",
     "get_notes",
-    "action_type",
+    "has_notes",
+    "get_notes_page",
     "add_note_to_db"
 ]
@@ -0,0 +1,260 @@
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+import sqlite_backend
+
+try:
+    import aiomysql
+    from aiomysql import InterfaceError, OperationalError
+except ImportError:  # SQLite-only installs don't need the MySQL driver
+    aiomysql = None
+
+# DB_BACKEND=sqlite runs every query against a local SQLite file instead of MySQL
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+
+if aiomysql is not None:
+    Error = (aiomysql.Error, sqlite3.Error)
+    DictCursor = aiomysql.DictCursor
+    SSDictCursor = aiomysql.SSDictCursor
+    _CONNECTION_ERRORS = (InterfaceError, OSError, asyncio.TimeoutError)
+else:
+    Error = (sqlite3.Error,)
+    DictCursor = sqlite_backend.DictCursor
+    SSDictCursor = sqlite_backend.SSDictCursor
+    _CONNECTION_ERRORS = (OSError, asyncio.TimeoutError)
+
+# Everything a database call can raise, including a connect that never completes
+DB_ERRORS = Error + (OSError, asyncio.TimeoutError)
+
+_pool = None
+_pool_lock = None
+
+
+class CircuitBreaker:
+    """Tracks database health so callers fail fast while MySQL is down.
+
+    closed    - queries go through normally.
+    open      - every call is refused until the backoff delay has passed.
+    half-open - one trial call is let through; success closes the breaker,
+                failure re-opens it with a doubled delay. A probe that hasn't
+                reported back within `probe_timeout` seconds is given up on
+                and the next caller probes instead.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=3, base_delay=1.0, max_delay=120.0, probe_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self.probe_deadline = 0.0
+        self.last_error = None
+        self.last_change = time.time()
+        self.rejected = 0
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"🔌 Database circuit breaker: {self.state} -> {state}")
+            self.state = state
+            self.last_change = time.time()
+
+    def allow_request(self):
+        """Returns True if a call may hit the database right now."""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if (self.state == self.OPEN and now >= self.retry_at) or \
+                (self.state == self.HALF_OPEN and now >= self.probe_deadline):
+            # Let exactly one caller probe the database
+            self._set_state(self.HALF_OPEN)
+            self.probe_deadline = now + self.probe_timeout
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+        self._set_state(self.CLOSED)
+
+    def record_failure(self, error):
+        self.last_error = str(error)
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            delay = min(self.base_delay * (2 ** self.trips), self.max_delay)
+            delay *= random.uniform(0.8, 1.2)  # Jitter so both bots don't retry in lockstep
+            self.trips += 1
+            self.retry_at = time.monotonic() + delay
+            self._set_state(self.OPEN)
+
+    def status(self):
+        """Returns a snapshot of the breaker for monitoring."""
+        retry_in = max(0.0, self.retry_at - time.monotonic()) if self.state == self.OPEN else 0.0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "retry_in": round(retry_in, 1),
+            "rejected_calls": self.rejected,
+            "last_error": self.last_error,
+            "since": self.last_change,
+        }
+
+
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('DB_BREAKER_THRESHOLD', 3)),
+    base_delay=float(os.getenv('DB_BREAKER_BASE_DELAY', 1.0)),
+    max_delay=float(os.getenv('DB_BREAKER_MAX_DELAY', 120.0)),
+    probe_timeout=float(os.getenv('DB_BREAKER_PROBE_TIMEOUT', 30.0))
+)
+
+
+def is_connection_error(error):
+    """True for errors that mean the server is unreachable, not a bad query."""
+    if isinstance(error, _CONNECTION_ERRORS):
+        return True
+    if aiomysql is not None and isinstance(error, OperationalError):
+        # 2xxx codes are client-side connection errors (2003 can't connect, 2013 lost connection, ...)
+        return bool(error.args) and isinstance(error.args[0], int) and error.args[0] >= 2000
+    return False
+
+
+def backend_name():
+    """Returns "mysql" or "sqlite" depending on DB_BACKEND."""
+    return "sqlite" if DB_BACKEND == "sqlite" else "mysql"
+
+
+async def _open_backend_pool():
+    if backend_name() == "sqlite":
+        return await sqlite_backend.create_sqlite_pool(
+            os.getenv('SQLITE_PATH', 'dixie.db'),
+            size=int(os.getenv('DB_POOL_MAX', 4))
+        )
+    if aiomysql is None:
+        raise RuntimeError("aiomysql is not installed. Install it or set DB_BACKEND=sqlite.")
+    return await aiomysql.create_pool(
+        host=os.getenv('MOD_HOST', 'localhost'),
+        port=int(os.getenv('MOD_PORT', 3306)),
+        user=os.getenv('MOD_USER', 'root'),
+        password=os.getenv('MOD_PASSWORD', ''),
+        db=os.getenv('MOD_DATABASE', 'mod_logs'),
+        minsize=int(os.getenv('DB_POOL_MIN', 2)),
+        maxsize=int(os.getenv('DB_POOL_MAX', 10)),
+        connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        pool_recycle=3600,
+        autocommit=True
+    )
+
+
+class _GuardedAcquire:
+    """Wraps pool.acquire() so every borrowed connection reports to the breaker."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    async def __aenter__(self):
+        try:
+            self._conn = await self._pool.acquire()
+        except BaseException as e:
+            # A cancelled probe proves nothing either way, so it can't leave the breaker half-open
+            if isinstance(e, DB_ERRORS) or breaker.state == breaker.HALF_OPEN:
+                breaker.record_failure(e)
+            raise
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None or (isinstance(exc, Error) and not is_connection_error(exc)):
+            # A query error still means the server answered
+            breaker.record_success()
+        elif is_connection_error(exc) or breaker.state == breaker.HALF_OPEN:
+            breaker.record_failure(exc)
+        self._pool.release(self._conn)
+        self._conn = None
+        return False
+
+
+class _GuardedPool:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def acquire(self):
+        return _GuardedAcquire(self._pool)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+async def create_pool():
+    """Creates the shared connection pool, or returns it if it already exists.
+
+    The pool opens DB_POOL_MIN connections up front so the first queries after
+    startup don't pay for the handshake. Returns None without touching the
+    network while the circuit breaker is open.
+    """
+    global _pool, _pool_lock
+
+    if not breaker.allow_request():
+        return None
+
+    if _pool is not None and not _pool.closed:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        # Another caller may have built the pool while we were waiting
+        if _pool is not None and not _pool.closed:
+            return _pool
+        try:
+            pool = await _open_backend_pool()
+        except DB_ERRORS as e:
+            if breaker.state == breaker.CLOSED and breaker.failures == 0:
+                print("❌ Error creating database connection pool:", e)
+            breaker.record_failure(e)
+            return None
+        _pool = _GuardedPool(pool)
+        breaker.record_success()
+        print(f"✅ Database connection pool ready ({backend_name()})!")
+        return _pool
+
+
+async def close_pool():
+    """Closes the shared pool and waits for its connections to be released."""
+    global _pool
+    if _pool is None:
+        return
+    _pool.close()
+    await _pool.wait_closed()
+    _pool = None
+
+
+def breaker_status():
+    """Returns the circuit breaker state for status commands and monitoring."""
+    return breaker.status()
+
+
+__all__ = [
+    "Error",
+    "DB_ERRORS",
+    "DictCursor",
+    "SSDictCursor",
+    "backend_name",
+    "CircuitBreaker",
+    "breaker",
+    "breaker_status",
+    "is_connection_error",
+    "create_pool",
+    "close_pool"
+]
@@ -0,0 +1,145 @@
+"""Async Gemini classifier for the marketplace budget check.
+
+The budget cog settles most messages with its price rules and only asks
+Gemini about the ambiguous band between the hard minimum and the safe
+price. One GenerativeModel is created up front and shared by every message.
+Calls go through generate_content_async() with a concurrency cap and a hard
+timeout, so a slow or stuck API call costs that one message its AI verdict
+and never holds up the event loop. verdict() returns None when a call fails;
+the cog lets such a message through and doesn't cache the result.
+
+Without an API key, or with GEMINI_STUB set, a local StubModel answers
+instead of the real API.
+"""
+import asyncio
+import logging
+import os
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Only needed when talking to the real API
+    genai = None
+
+logger = logging.getLogger("gemini_client")
+
+PROMPT = """
+You are a moderator assistant reviewing marketplace messages.
+**Only flag messages as "INVALID" if they contain a price below $15 USD.**
+**Ignore prices labeled as add-ons, fees, or commercial use fees.**
+**Bulk deals (e.g., "minimum", "bundle", "bulk", "at least") are valid.**
+**TAT (Turnaround Time) mentions make the message valid.**
+** if mentions of Turn Around Time / TAT then the message is VALID**
+**If "payment after sketch" are invalid**
+**User Message:**
+{text}
+"""
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel: answers `reply` after `delay` seconds."""
+
+    def __init__(self, reply="VALID", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+
+    async def generate_content_async(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        return StubResponse(self.reply)
+
+
+class GeminiClassifier:
+    """Classifies messages as "VALID" or "INVALID" with at most `max_concurrency` calls in flight.
+
+    `timeout` covers both waiting for a free slot and the API call itself.
+    """
+
+    def __init__(self, model, timeout=8.0, max_concurrency=4):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.stub = isinstance(model, StubModel)
+        self.in_flight = 0
+        self.calls = 0
+        self.invalid = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def _generate(self, prompt):
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                response = await self.model.generate_content_async(prompt)
+            finally:
+                self.in_flight -= 1
+            return response.text
+
+    async def verdict(self, text):
+        """Returns "VALID" or "INVALID", or None when the call timed out or failed."""
+        self.calls += 1
+        try:
+            reply = await asyncio.wait_for(self._generate(PROMPT.format(text=text)), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"Gemini check timed out after {self.timeout}s")
+            return None
+        except Exception as e:
+            self.errors += 1
+            print(f"Gemini check failed: {e}")
+            return None
+        if "INVALID" in reply:
+            self.invalid += 1
+            return "INVALID"
+        return "VALID"
+
+    async def classify(self, text):
+        """Like verdict(), but a failed call counts as VALID."""
+        return await self.verdict(text) or "VALID"
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "invalid": self.invalid,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+        }
+
+
+def create_classifier():
+    """Builds the classifier from the environment (API_KEY, GEMINI_MODEL, GEMINI_TIMEOUT,
+    GEMINI_CONCURRENCY, GEMINI_STUB)."""
+    timeout = float(os.getenv("GEMINI_TIMEOUT", "8"))
+    max_concurrency = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+    api_key = os.getenv("API_KEY")
+    stub = os.getenv("GEMINI_STUB")
+    if stub:
+        reply = stub if stub in ("VALID", "INVALID") else "VALID"
+        logger.warning("GEMINI_STUB is set: the Gemini check uses the local stub and answers %s for every message.", reply)
+        return GeminiClassifier(StubModel(reply), timeout, max_concurrency)
+    if not api_key or genai is None:
+        missing = "API_KEY is not set" if not api_key else "google-generativeai is not installed"
+        logger.error(
+            "\n%s\nGEMINI CHECK DISABLED: %s.\n"
+            "Falling back to the local stub, which answers VALID for every message Gemini would have reviewed.\n"
+            "Only the price rules can flag marketplace messages until this is fixed.\n%s",
+            "=" * 72, missing, "=" * 72
+        )
+        return GeminiClassifier(StubModel("VALID"), timeout, max_concurrency)
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-pro"))
+    return GeminiClassifier(model, timeout, max_concurrency)
+
+
+__all__ = [
+    "StubModel",
+    "GeminiClassifier",
+    "create_classifier"
+]
@@ -6,24 +6,19 @@ from discord.ext import commands
 from dotenv import load_dotenv
 import os
 import sys
+import asyncio
 import datetime
 import subprocess
 from verification import Security
 
 CREATOR_ID = 766005564190359552 
 
-from dbconn import (
-    create_table,
-)
-from dbconnMOD import (
-     create_mod_log_table,
-)
+from migrations import run_migrations
+from dbconnMOD import flush_mod_logs
+from dbpool import create_pool, close_pool, breaker_status
 
 load_dotenv()
 
-create_table()
-create_mod_log_table()
-
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
@@ -66,7 +61,11 @@ async def restart(ctx):
 @bot.command()
 async def status(ctx):
     """Check the status of the bot."""
-    await ctx.send(f"Bot Version: {VERSION}\nLast Updated: {LAST_UPDATED}\nCurrent Status: Online")
+    db = breaker_status()
+    db_line = f"Database: {db['state']}"
+    if db['state'] != "closed":
+        db_line += f" (retry in {db['retry_in']}s, {db['rejected_calls']} calls refused, last error: {db['last_error']})"
+    await ctx.send(f"Bot Version: {VERSION}\nLast Updated: {LAST_UPDATED}\nCurrent Status: Online\n{db_line}")
 
 @bot.event
 async def on_message(message):
@@ -90,8 +89,20 @@ if __name__ == "__main__":
 
 
 
+async def runner():
+    async with bot:
+        # Warm the DB pool before the gateway starts dispatching events
+        await create_pool()
+        await run_migrations()
+        try:
+            await bot.start(DISCORD_TOKEN)
+        finally:
+            await flush_mod_logs()
+            await close_pool()
+
+
 try:
-    bot.run(DISCORD_TOKEN)
+    asyncio.run(runner())
 except discord.errors.LoginFailure as e:
     print(f"Failed to log in: {e}")
 except Exception as e:
@@ -0,0 +1,353 @@
+"""Versioned schema migrations for the verification and mod log tables.
+
+Every schema change goes into MIGRATIONS as (version, description, function).
+run_migrations() records applied versions in `schema_migrations` and only runs
+the ones that are missing, so it is safe to call on every startup. MySQL
+commits DDL implicitly, so each step checks information_schema before it
+alters anything and can be re-run if a previous attempt died half way.
+"""
+from dbpool import Error, backend_name, create_pool
+
+
+async def _column_exists(cursor, table, column):
+    if backend_name() == "sqlite":
+        await cursor.execute(f"PRAGMA table_info({table});")
+        return any(row[1] == column for row in await cursor.fetchall())
+    await cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s;
+        """,
+        (table, column)
+    )
+    result = await cursor.fetchone()
+    return bool(result and result[0])
+
+
+async def _index_exists(cursor, table, index):
+    if backend_name() == "sqlite":
+        await cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s;",
+            (table, index)
+        )
+        result = await cursor.fetchone()
+        return bool(result and result[0])
+    await cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s;
+        """,
+        (table, index)
+    )
+    result = await cursor.fetchone()
+    return bool(result and result[0])
+
+
+async def _create_index(cursor, table, index, columns):
+    if not await _index_exists(cursor, table, index):
+        await cursor.execute(f"CREATE INDEX {index} ON {table} ({columns});")
+
+
+async def _m001_base_tables(cursor):
+    """Creates user_data and mod_logs as dbconn/dbconnMOD expect them."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            join_time DATETIME NOT NULL,
+            user_id VARCHAR(100) PRIMARY KEY,
+            password VARCHAR(100) NOT NULL
+        );
+    """)
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mod_logs (
+            log_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(100) NOT NULL,
+            reason TEXT NOT NULL,
+            moderator_id VARCHAR(100) NOT NULL,
+            action_type VARCHAR(100) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT DEFAULT NULL
+        );
+    """)
+
+
+async def _m002_reconcile_legacy_mod_logs(cursor):
+    """Brings a mod_logs table created by the old modlogs.py up to the dbconnMOD schema.
+
+    The legacy layout had nullable columns, a shorter action_type and no notes
+    column. This also replaces the old ad hoc add_action_column() helper.
+    """
+    if not await _column_exists(cursor, "mod_logs", "action_type"):
+        await cursor.execute("ALTER TABLE mod_logs ADD COLUMN action_type VARCHAR(100) NOT NULL DEFAULT 'unknown';")
+    if not await _column_exists(cursor, "mod_logs", "notes"):
+        await cursor.execute("ALTER TABLE mod_logs ADD COLUMN notes TEXT DEFAULT NULL;")
+
+    # Legacy rows may hold NULLs that the NOT NULL columns below would reject
+    await cursor.execute("UPDATE mod_logs SET user_id = '' WHERE user_id IS NULL;")
+    await cursor.execute("UPDATE mod_logs SET moderator_id = '' WHERE moderator_id IS NULL;")
+    await cursor.execute("UPDATE mod_logs SET reason = '' WHERE reason IS NULL;")
+    await cursor.execute("UPDATE mod_logs SET action_type = 'unknown' WHERE action_type IS NULL;")
+    if backend_name() == "sqlite":
+        return  # SQLite files are always created by migration 1, so there is no legacy layout
+    await cursor.execute("""
+        ALTER TABLE mod_logs
+            MODIFY user_id VARCHAR(100) NOT NULL,
+            MODIFY reason TEXT NOT NULL,
+            MODIFY moderator_id VARCHAR(100) NOT NULL,
+            MODIFY action_type VARCHAR(100) NOT NULL,
+            MODIFY timestamp DATETIME DEFAULT CURRENT_TIMESTAMP;
+    """)
+
+
+async def _m003_mod_logs_indexes(cursor):
+    """Indexes the columns the warning lookups, remove_warning and the history pages filter on."""
+    await _create_index(cursor, "mod_logs", "idx_mod_logs_user_action_time", "user_id, action_type, timestamp")
+    await _create_index(cursor, "mod_logs", "idx_mod_logs_user_time", "user_id, timestamp")
+    await _create_index(cursor, "mod_logs", "idx_mod_logs_moderator_time", "moderator_id, timestamp")
+
+
+async def _m004_mod_notes(cursor):
+    """Moves notes out of the per-row mod_logs.notes blob into an append-only table.
+
+    The old add_note_to_db() appended each note to every log row the user had
+    at the time, so the user's oldest row holds the most complete copy.
+    """
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mod_notes (
+            note_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(100) NOT NULL,
+            moderator_id VARCHAR(100) DEFAULT NULL,
+            note TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await _create_index(cursor, "mod_notes", "idx_mod_notes_user", "user_id, note_id")
+    await cursor.execute("SELECT COUNT(*) FROM mod_notes;")
+    if (await cursor.fetchone())[0]:
+        return  # Already backfilled by an earlier, interrupted run
+    await cursor.execute("""
+        SELECT m.user_id, m.notes, m.timestamp FROM mod_logs m
+        JOIN (
+            SELECT MIN(log_id) AS log_id FROM mod_logs
+            WHERE notes IS NOT NULL AND notes <> ''
+            GROUP BY user_id
+        ) oldest ON oldest.log_id = m.log_id;
+    """)
+    legacy = await cursor.fetchall()
+    rows = [
+        (user_id, note.strip(), timestamp)
+        for user_id, notes, timestamp in legacy
+        for note in notes.split("\n")
+        if note.strip()
+    ]
+    if rows:
+        await cursor.executemany(
+            "INSERT INTO mod_notes (user_id, note, created_at) VALUES (%s, %s, %s);",
+            rows
+        )
+
+
+async def _m005_user_summary(cursor):
+    """Adds the per-user moderation summary behind get_warning_counts() and fills it from mod_logs."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mod_user_summary (
+            user_id VARCHAR(100) PRIMARY KEY,
+            minor_count INT NOT NULL DEFAULT 0,
+            major_count INT NOT NULL DEFAULT 0,
+            last_action VARCHAR(100) DEFAULT NULL,
+            last_timestamp DATETIME DEFAULT NULL
+        );
+    """)
+    await cursor.execute("DELETE FROM mod_user_summary;")
+    await cursor.execute("""
+        INSERT INTO mod_user_summary (user_id, minor_count, major_count, last_timestamp)
+        SELECT user_id,
+               SUM(action_type = 'minor_warning'),
+               SUM(action_type = 'major_warning'),
+               MAX(timestamp)
+        FROM mod_logs
+        GROUP BY user_id;
+    """)
+    await cursor.execute("""
+        UPDATE mod_user_summary
+        SET last_action = (
+            SELECT m.action_type FROM mod_logs m
+            WHERE m.user_id = mod_user_summary.user_id
+            ORDER BY m.timestamp DESC, m.log_id DESC
+            LIMIT 1
+        );
+    """)
+
+
+async def _m006_mod_logs_archive(cursor):
+    """Adds the archive table that expired warnings are moved into by the retention task."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mod_logs_archive (
+            log_id INT PRIMARY KEY,
+            user_id VARCHAR(100) NOT NULL,
+            reason TEXT NOT NULL,
+            moderator_id VARCHAR(100) NOT NULL,
+            action_type VARCHAR(100) NOT NULL,
+            timestamp DATETIME DEFAULT NULL,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await _create_index(cursor, "mod_logs_archive", "idx_mod_logs_archive_user_time", "user_id, timestamp")
+    await _create_index(cursor, "mod_logs_archive", "idx_mod_logs_archive_moderator_time", "moderator_id, timestamp")
+    # The retention task scans for the oldest rows of one action type
+    await _create_index(cursor, "mod_logs", "idx_mod_logs_action_time", "action_type, timestamp")
+
+
+async def _m007_full_text_search(cursor):
+    """Adds full-text indexes over mod log reasons and notes for !modsearch.
+
+    MySQL gets FULLTEXT indexes on the columns themselves. SQLite gets FTS5
+    tables that index mod_logs/mod_notes as external content and are kept in
+    sync by triggers.
+    """
+    if backend_name() != "sqlite":
+        if not await _index_exists(cursor, "mod_logs", "ft_mod_logs_reason"):
+            await cursor.execute("CREATE FULLTEXT INDEX ft_mod_logs_reason ON mod_logs (reason);")
+        if not await _index_exists(cursor, "mod_notes", "ft_mod_notes_note"):
+            await cursor.execute("CREATE FULLTEXT INDEX ft_mod_notes_note ON mod_notes (note);")
+        return
+
+    await _create_fts(cursor, "mod_logs", "reason", "log_id")
+    await _create_fts(cursor, "mod_notes", "note", "note_id")
+
+
+async def _create_fts(cursor, table, column, key):
+    """Creates an external-content FTS5 index over `table`.`column` (SQLite only), kept in sync by triggers."""
+    fts = f"{table}_fts"
+    await cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column}, content='{table}', content_rowid='{key}');"
+    )
+    await cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.{key}, new.{column});
+        END;
+    """)
+    await cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column});
+        END;
+    """)
+    await cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column});
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.{key}, new.{column});
+        END;
+    """)
+    await cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild');")
+
+
+async def _m008_import_checkpoints(cursor):
+    """Adds the table modimport.py records its progress in, per input file."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source VARCHAR(255) PRIMARY KEY,
+            records_done INT NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+async def _m009_audit_log_cursor(cursor):
+    """Adds the per-guild cursor for the audit log ingester."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audit_log_cursor (
+            guild_id VARCHAR(100) PRIMARY KEY,
+            last_entry_id BIGINT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+async def _m010_mod_activity_daily(cursor):
+    """Adds per-day moderator activity counts for !modstats and fills them from existing logs."""
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mod_activity_daily (
+            day DATE NOT NULL,
+            moderator_id VARCHAR(100) NOT NULL,
+            action_type VARCHAR(100) NOT NULL,
+            action_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, moderator_id, action_type)
+        );
+    """)
+    await _create_index(cursor, "mod_activity_daily", "idx_mod_activity_moderator_day", "moderator_id, day")
+    await cursor.execute("DELETE FROM mod_activity_daily;")
+    await cursor.execute("""
+        INSERT INTO mod_activity_daily (day, moderator_id, action_type, action_count)
+        SELECT DATE(timestamp), moderator_id, action_type, COUNT(*)
+        FROM (
+            SELECT moderator_id, action_type, timestamp FROM mod_logs
+            UNION ALL
+            SELECT moderator_id, action_type, timestamp FROM mod_logs_archive
+        ) AS logs
+        WHERE timestamp IS NOT NULL
+        GROUP BY DATE(timestamp), moderator_id, action_type;
+    """)
+
+
+async def _m011_archive_full_text_search(cursor):
+    """Indexes archived warning reasons too, so !modsearch still finds them after retention runs."""
+    if backend_name() != "sqlite":
+        if not await _index_exists(cursor, "mod_logs_archive", "ft_mod_logs_archive_reason"):
+            await cursor.execute("CREATE FULLTEXT INDEX ft_mod_logs_archive_reason ON mod_logs_archive (reason);")
+        return
+    await _create_fts(cursor, "mod_logs_archive", "reason", "log_id")
+
+
+MIGRATIONS = [
+    (1, "create user_data and mod_logs", _m001_base_tables),
+    (2, "reconcile legacy modlogs.py schema", _m002_reconcile_legacy_mod_logs),
+    (3, "add mod_logs lookup indexes", _m003_mod_logs_indexes),
+    (4, "move notes into mod_notes", _m004_mod_notes),
+    (5, "add mod_user_summary", _m005_user_summary),
+    (6, "add mod_logs_archive", _m006_mod_logs_archive),
+    (7, "add full-text search indexes", _m007_full_text_search),
+    (8, "add import_checkpoints", _m008_import_checkpoints),
+    (9, "add audit_log_cursor", _m009_audit_log_cursor),
+    (10, "add mod_activity_daily", _m010_mod_activity_daily),
+    (11, "add full-text search over mod_logs_archive", _m011_archive_full_text_search),
+]
+
+
+async def run_migrations():
+    """Applies every migration that hasn't been recorded yet. Returns True on success."""
+    pool = await create_pool()
+    if pool is None:
+        print("❌ No database connection. Skipping migrations.")
+        return False
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                await cursor.execute("SELECT version FROM schema_migrations;")
+                applied = {row[0] for row in await cursor.fetchall()}
+
+                for version, description, migrate in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    print(f"Applying migration {version}: {description}")
+                    await migrate(cursor)
+                    await cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                        (version, description)
+                    )
+        print("✅ Database schema is up to date.")
+        return True
+    except Error as e:
+        print("❌ Error running migrations:", e)
+        return False
+
+
+__all__ = [
+    "MIGRATIONS",
+    "run_migrations"
+]
@@ -0,0 +1,283 @@
+"""Bulk import of moderation history into mod_logs.
+
+Reads CSV, JSON arrays or JSON lines (optionally gzipped) one record at a
+time, maps each record onto the dbconnMOD row layout and writes it in large
+batches through import_mod_logs_batch(). Each batch commits together with a
+checkpoint in import_checkpoints, so an interrupted import picks up after the
+last committed batch when it is run again on the same file.
+
+Headerless CSV files are read in the old modlogs.py column order
+(log_id, user_id, action_type, reason, moderator_id, timestamp).
+
+Usage: python modimport.py <file> [--format csv|json|jsonl] [--batch-size N]
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import itertools
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from dbconnMOD import get_import_checkpoint, import_mod_logs_batch
+from dbpool import close_pool
+
+LEGACY_COLUMNS = ["log_id", "user_id", "action_type", "reason", "moderator_id", "timestamp"]
+
+# Column names used by other bots' exports, mapped to ours
+FIELD_ALIASES = {
+    "user_id": ("user_id", "userid", "user", "target_id", "target", "member_id", "member"),
+    "moderator_id": ("moderator_id", "moderatorid", "moderator", "mod_id", "mod", "responsible_id", "actor_id", "executor_id"),
+    "action_type": ("action_type", "action", "type", "punishment", "case_type"),
+    "reason": ("reason", "description", "message"),
+    "timestamp": ("timestamp", "date", "created_at", "time", "created"),
+}
+
+ACTION_ALIASES = {
+    "warn": "minor_warning",
+    "warning": "minor_warning",
+    "minor": "minor_warning",
+    "major": "major_warning",
+    "mute": "timeout",
+    "tempmute": "timeout",
+}
+
+TIMESTAMP_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%Y-%m-%d",
+                     "%Y%m%d%H%M%S", "%Y%m%d"]
+
+# Numbers outside 2000-01-01 .. 2100-01-01 (in seconds or milliseconds) aren't taken as epochs
+EPOCH_RANGE = (946684800, 4102444800)
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        return "jsonl"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def _iter_csv(handle):
+    reader = csv.reader(handle)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip().lower() for column in first]
+    if any(name in header for names in FIELD_ALIASES.values() for name in names):
+        for row in reader:
+            yield dict(zip(header, row))
+        return
+    # No header: the old modlogs.py layout, with or without log_id in front
+    for row in itertools.chain([first], reader):
+        columns = LEGACY_COLUMNS if len(row) >= len(LEGACY_COLUMNS) else LEGACY_COLUMNS[1:]
+        yield dict(zip(columns, row))
+
+
+_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def _iter_json_array(handle, chunk_size=65536):
+    """Yields the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = handle.read(chunk_size).lstrip()
+    if not buffer:
+        return
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of records")
+    pos = 1
+    eof = False
+    while True:
+        pos = _SEPARATOR.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Drop what has been consumed and read on; only one record is ever buffered
+            chunk = handle.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+
+
+def _iter_jsonl(handle):
+    for line in handle:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_records(path, fmt=None):
+    """Yields raw records (dicts) from an export file one at a time."""
+    fmt = fmt or _detect_format(path)
+    with _open_text(path) as handle:
+        if fmt == "json":
+            yield from _iter_json_array(handle)
+        elif fmt == "jsonl":
+            yield from _iter_jsonl(handle)
+        else:
+            yield from _iter_csv(handle)
+
+
+def _field(record, field):
+    for name in FIELD_ALIASES[field]:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_timestamp(value):
+    if value is None or isinstance(value, bool):
+        return None
+    text = str(value).strip()
+    if isinstance(value, (int, float)) or text.isdigit():
+        # Compact dates like 20240101 are digits too, so only plausible epochs count
+        number = float(value)
+        for seconds in (number, number / 1000):
+            if EPOCH_RANGE[0] <= seconds < EPOCH_RANGE[1]:
+                return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        for fmt in TIMESTAMP_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def normalize(record):
+    """Maps one raw record onto a (user_id, reason, moderator_id, action_type, timestamp) row.
+
+    Returns None for records that can't be imported (no user or no usable timestamp).
+    """
+    if not isinstance(record, dict):
+        return None
+    record = {str(key).strip().lower(): value for key, value in record.items()}
+    user_id = _field(record, "user_id")
+    timestamp = _parse_timestamp(_field(record, "timestamp"))
+    if user_id is None or timestamp is None:
+        return None
+    action_type = str(_field(record, "action_type") or "unknown").strip().lower().replace(" ", "_")
+    action_type = ACTION_ALIASES.get(action_type, action_type)
+    reason = str(_field(record, "reason") or "No reason provided")
+    moderator_id = str(_field(record, "moderator_id") or "")
+    return (str(user_id).strip(), reason, moderator_id.strip(), action_type[:100], timestamp)
+
+
+def _read_chunk(records, size):
+    """Reads and normalizes the next `size` records. Runs in a worker thread."""
+    return [normalize(record) for record in itertools.islice(records, size)]
+
+
+def source_key(path, name=None):
+    """Identifies an input file for checkpointing: its name plus its size."""
+    return f"{name or os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+async def import_mod_logs(path, fmt=None, batch_size=5000, source=None, progress=None, pause=0.05):
+    """Imports an export file into mod_logs. Returns a dict of counters.
+
+    `progress` is called with the counters after each committed batch. The
+    file is decompressed and parsed in a worker thread one batch at a time,
+    and the short `pause` between batches keeps a long backfill from starving
+    the bots' own queries.
+    """
+    source = source or source_key(path)
+    done = await get_import_checkpoint(source)
+    if done is None:
+        raise RuntimeError("Database unavailable, nothing imported.")
+
+    stats = {"source": source, "resumed_from": done, "read": 0, "imported": 0, "skipped": 0, "started": time.monotonic()}
+    batch = []
+    position = 0
+    records = read_records(path, fmt)
+    try:
+        while True:
+            rows = await asyncio.to_thread(_read_chunk, records, batch_size)
+            if not rows:
+                break
+            for row in rows:
+                position += 1
+                if position <= done:
+                    continue  # Already committed by an earlier run
+                stats["read"] += 1
+                if row is None:
+                    stats["skipped"] += 1
+                else:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    await _commit_batch(batch, source, position, stats, progress)
+                    batch = []
+                    await asyncio.sleep(pause)
+    finally:
+        records.close()
+    if position > done:
+        await _commit_batch(batch, source, position, stats, progress)
+    stats["elapsed"] = time.monotonic() - stats.pop("started")
+    return stats
+
+
+async def _commit_batch(batch, source, position, stats, progress):
+    if not await import_mod_logs_batch(batch, source, position):
+        raise RuntimeError(f"Import stopped at record {position}; run it again to resume.")
+    stats["imported"] += len(batch)
+    if progress is not None:
+        await progress(stats)
+
+
+async def _print_progress(stats):
+    rate = stats["imported"] / max(time.monotonic() - stats["started"], 0.001)
+    print(f"Imported {stats['imported']} rows ({stats['skipped']} skipped) - {rate:.0f} rows/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Import moderation history into mod_logs.")
+    parser.add_argument("path", help="CSV, JSON or JSON lines file, optionally .gz")
+    parser.add_argument("--format", choices=["csv", "json", "jsonl"], default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        stats = await import_mod_logs(args.path, args.format, args.batch_size, progress=_print_progress)
+        if stats["resumed_from"]:
+            print(f"Resumed after record {stats['resumed_from']}.")
+        print(f"✅ Imported {stats['imported']} rows, skipped {stats['skipped']}, in {stats['elapsed']:.1f}s.")
+    except (RuntimeError, ValueError, csv.Error) as e:
+        print("❌", e)
+    finally:
+        await close_pool()
+
+
+__all__ = [
+    "read_records",
+    "normalize",
+    "source_key",
+    "import_mod_logs"
+]
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,79 +1,39 @@
-import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
-import os
+"""Legacy entry points from the original mod log module.
 
-_connection = None
+The old table layout defined here is reconciled with the dbconnMOD schema by
+migration 2 in migrations.py, so these helpers now just forward to the shared
+data layer. Note the legacy argument order: action_type comes before reason.
+"""
+import asyncio
+
+from dbconnMOD import add_mod_log, flush_mod_logs
+from dbpool import close_pool
+from migrations import run_migrations
 
-def create_connection():
-    """Creates or retrieves a global connection to the mod_logs database."""
-    global _connection
-    try:
-        if _connection is None or not _connection.is_connected():
-            _connection = mysql.connector.connect(
-                host=os.getenv('MOD_HOST'),
-                port=os.getenv('MOD_PORT'),
-                user=os.getenv('MOD_USER'),
-                password=os.getenv('MOD_PASSWORD'),
-                database=os.getenv('MOD_DATABASE')
-            )
-        return _connection
-    except Error as e:
-        print("Error connecting to mod_logs database:", e)
-        return None
 
-def create_logs_table():
+async def create_logs_table():
     """Creates the 'mod_logs' table if it does not already exist."""
-    connection = create_connection()
-    if connection is None:
-        return
-    try:
-        cursor = connection.cursor()
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS mod_logs (
-            log_id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id VARCHAR(100),
-            action_type VARCHAR(50),
-            reason TEXT,
-            moderator_id VARCHAR(100),
-            timestamp DATETIME
-        );
-        """
-        cursor.execute(create_table_query)
-        connection.commit()
-    except Error as e:
-        print("Error creating mod_logs table:", e)
-    finally:
-        cursor.close()
+    await run_migrations()
 
-def insert_mod_log(user_id, action_type, reason, moderator_id):
+async def insert_mod_log(user_id, action_type, reason, moderator_id):
     """Inserts a new log entry into the 'mod_logs' table."""
-    connection = create_connection()
-    if connection is None:
-        return
-    try:
-        cursor = connection.cursor()
-        insert_query = """
-        INSERT INTO mod_logs (user_id, action_type, reason, moderator_id, timestamp)
-        VALUES (%s, %s, %s, %s, %s);
-        """
-
-        cursor.execute(insert_query, (user_id, action_type, reason, moderator_id, datetime.now()))
-        connection.commit()
-    except Error as e:
-        print("Error inserting mod log:", e)
-    finally:
-        cursor.close()
+    return await add_mod_log(user_id, reason, moderator_id, action_type)
 
 # Example Test Function
-def test_insert_mod_log():
+async def test_insert_mod_log():
     """Test the insert_mod_log function."""
     try:
-        insert_mod_log("user123", "ban", "Inappropriate behavior", "mod456")
-        print("insert_mod_log: SUCCESS")
+        await insert_mod_log("user123", "ban", "Inappropriate behavior", "mod456")
+        # add_mod_log only buffers the row; write it out before the event loop goes away
+        if await flush_mod_logs():
+            print("insert_mod_log: SUCCESS")
+        else:
+            print("insert_mod_log: FAIL row was not written")
     except Exception as e:
         print("insert_mod_log: FAIL", e)
+    finally:
+        await close_pool()
 
 if __name__ == "__main__":
     print("Testing insert_mod_log function...")
-    test_insert_mod_log()
+    asyncio.run(test_insert_mod_log())
@@ -0,0 +1,94 @@
+"""Price extraction for the marketplace budget check.
+
+All patterns are compiled once at import. tokenize() strips links, custom
+emoji, unicode emoji and the TAT/SLOTS keywords in a single substitution and
+then collects the price tokens in a single scan of what is left, so a
+message is walked twice by the regex engine instead of once per rule.
+"""
+import re
+
+import emoji
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+
+
+def _char_class(chars):
+    """Collapses code points into a regex character class body made of ranges."""
+    ranges = []
+    for point in sorted(map(ord, chars)):
+        if ranges and point == ranges[-1][1] + 1:
+            ranges[-1][1] = point
+        else:
+            ranges.append([point, point])
+    return "".join(
+        re.escape(chr(low)) if low == high else f"{re.escape(chr(low))}-{re.escape(chr(high))}"
+        for low, high in ranges
+    )
+
+
+def _emoji_pattern():
+    """Matches the spans emoji.replace_emoji() removes, as one flat pattern.
+
+    Every non-ASCII code point that is an emoji on its own goes into a single
+    class; variation selectors, tags and ZWJ only count inside a run of them.
+    Flags are spelled out pair by pair, and keycaps are the one sequence that
+    starts with an ASCII character.
+    """
+    singles = _char_class({code for code in emoji.EMOJI_DATA if len(code) == 1 and not code.isascii()})
+    flags = {}
+    for code in emoji.EMOJI_DATA:
+        if len(code) == 2 and all("\U0001F1E6" <= char <= "\U0001F1FF" for char in code):
+            flags.setdefault(code[0], set()).add(code[1])
+    flag = "|".join(f"{re.escape(first)}[{_char_class(seconds)}]" for first, seconds in sorted(flags.items()))
+    start = rf"[{singles}]|{flag}"
+    extend = rf"[\ufe0e\ufe0f\U000E0020-\U000E007F]|(?<=[{singles}])\u200d|\u200d(?=[{singles}])"
+    return (
+        r"[#*0-9]\ufe0f?\u20e3"
+        rf"|(?:{start})(?:{start}|{extend})*"
+        r"|[\ufe0e\ufe0f]"
+    )
+
+
+_STRIP = re.compile(
+    r"https?://\S+"
+    r"|<a?:\w+:\d+>"
+    r"|(?i:TAT|TURN AROUND TIME|SLOTS)"
+    r"|" + _emoji_pattern()
+)
+
+_CURRENCY = r"[$€£¥₹]|USD|EUR|GBP|JPY|INR"
+_PRICE = re.compile(
+    r"(?P<range>\$100-\$140)"  # The server's own suggested range, never a violation
+    rf"|(?P<currency>{_CURRENCY})?\s*(?P<amount>\d+(?:\.\d+)?)\s*(?P<post_currency>{_CURRENCY})?",
+    re.IGNORECASE,
+)
+
+
+def clean_text(text):
+    """Removes links, custom and unicode emoji and the TAT/SLOTS keywords."""
+    return _STRIP.sub("", text)
+
+
+def extract_prices(text):
+    """Returns (amount, currency code) for every price in already cleaned text."""
+    prices = []
+    for match in _PRICE.finditer(text):
+        if match.group("range"):
+            continue
+        currency = match.group("post_currency") or match.group("currency")
+        prices.append((float(match.group("amount")), CURRENCY_SYMBOLS.get(currency, "USD")))
+    return prices
+
+
+def tokenize(text):
+    """Returns (cleaned text, price tokens) for a raw message."""
+    cleaned = clean_text(text)
+    return cleaned, extract_prices(cleaned)
+
+
+__all__ = [
+    "CURRENCY_SYMBOLS",
+    "clean_text",
+    "extract_prices",
+    "tokenize"
+]
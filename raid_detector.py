@@ -0,0 +1,102 @@
+"""Streaming join-raid detection for the verification cog.
+
+RaidDetector keeps the joins of the last `window` seconds in a fixed-size
+ring buffer together with running counters (joins per account-age bucket
+and joins per account-creation hour). Counters are updated as joins enter
+and leave the window, so each join costs O(1) however large the guild is.
+"""
+from collections import deque
+
+# Upper bounds (in hours) of the account-age histogram buckets
+AGE_BUCKETS = [1, 24, 24 * 7, 24 * 30]
+AGE_LABELS = ["<1h", "<1d", "<7d", "<30d", "older"]
+
+
+def _age_bucket(age_hours):
+    for index, limit in enumerate(AGE_BUCKETS):
+        if age_hours < limit:
+            return index
+    return len(AGE_BUCKETS)
+
+
+class RaidDetector:
+    """Sliding-window join rate, account-age histogram and creation-time clustering.
+
+    record_join() returns a reason string the first time a threshold trips
+    and None otherwise; call reset() once the raid has been dealt with.
+    """
+
+    def __init__(self, window=120, join_threshold=30, young_days=7, young_threshold=20,
+                 cluster_threshold=15, capacity=1024):
+        self.window = window
+        self.join_threshold = join_threshold
+        self.young_hours = young_days * 24
+        self.young_threshold = young_threshold
+        self.cluster_threshold = cluster_threshold
+        self.capacity = capacity
+        self.joins = deque()  # (joined_at, age_bucket, created_hour, young), oldest first
+        self.age_counts = [0] * len(AGE_LABELS)
+        self.hour_counts = {}
+        self.young = 0
+        self.tripped = False
+
+    def _evict(self):
+        _, bucket, hour, young = self.joins.popleft()
+        self.age_counts[bucket] -= 1
+        remaining = self.hour_counts[hour] - 1
+        if remaining:
+            self.hour_counts[hour] = remaining
+        else:
+            del self.hour_counts[hour]
+        self.young -= young
+
+    def record_join(self, joined_at, created_at):
+        """Adds one join (both arguments are aware datetimes). Returns a reason if this join trips the detector."""
+        now = joined_at.timestamp()
+        while self.joins and self.joins[0][0] <= now - self.window:
+            self._evict()
+        if len(self.joins) >= self.capacity:
+            self._evict()
+
+        age_hours = max(0.0, (joined_at - created_at).total_seconds() / 3600)
+        bucket = _age_bucket(age_hours)
+        hour = int(created_at.timestamp() // 3600)
+        young = age_hours < self.young_hours
+        self.joins.append((now, bucket, hour, young))
+        self.age_counts[bucket] += 1
+        self.hour_counts[hour] = self.hour_counts.get(hour, 0) + 1
+        self.young += young
+
+        if self.tripped:
+            return None
+        reason = None
+        if len(self.joins) >= self.join_threshold:
+            reason = f"{len(self.joins)} joins in {self.window}s"
+        elif self.hour_counts[hour] >= self.cluster_threshold:
+            reason = f"{self.hour_counts[hour]} joining accounts were created in the same hour"
+        elif self.young >= self.young_threshold:
+            reason = f"{self.young} accounts younger than {self.young_hours // 24} days joined in {self.window}s"
+        if reason:
+            self.tripped = True
+        return reason
+
+    def snapshot(self):
+        """Returns the current window's statistics for alerts and status commands."""
+        return {
+            "joins": len(self.joins),
+            "window": self.window,
+            "young": self.young,
+            "largest_creation_cluster": max(self.hour_counts.values(), default=0),
+            "age_histogram": dict(zip(AGE_LABELS, self.age_counts)),
+            "tripped": self.tripped,
+        }
+
+    def reset(self):
+        """Re-arms the detector after a lockdown; the window keeps its joins."""
+        self.tripped = False
+
+
+__all__ = [
+    "AGE_LABELS",
+    "RaidDetector"
+]
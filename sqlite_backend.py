@@ -0,0 +1,243 @@
+"""SQLite stand-in for the aiomysql pool, used when DB_BACKEND=sqlite.
+
+SQLitePool mirrors the small part of the aiomysql API the data layers use
+(pool.acquire(), conn.cursor(DictCursor), cursor.execute/executemany/fetch*,
+conn.begin/commit/rollback), so dbconn, dbconnMOD and the modmail
+DatabaseManager run unchanged against a local WAL-mode database file.
+MySQL-only syntax is rewritten by translate() before a query runs. sqlite3
+calls are blocking, so each one is handed to a worker thread.
+"""
+import asyncio
+import re
+import sqlite3
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+Error = sqlite3.Error
+
+
+class DictCursor:
+    """Marker passed to conn.cursor() for dict rows, like aiomysql.DictCursor."""
+
+
+class SSDictCursor(DictCursor):
+    """Marker for streaming dict rows; SQLite cursors always stream."""
+
+
+def _adapt_datetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _convert_datetime(value):
+    text = value.decode()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _convert_date(value):
+    try:
+        return date.fromisoformat(value.decode()[:10])
+    except ValueError:
+        return value.decode()
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", _convert_date)
+
+
+_REWRITES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "datetime('now')"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"\bGREATEST\(", re.IGNORECASE), "MAX("),
+    (re.compile(r"\bLEAST\(", re.IGNORECASE), "MIN("),
+    (re.compile(r"\bIF\(", re.IGNORECASE), "IIF("),
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE), ""),
+    (re.compile(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+]
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate(query):
+    """Rewrites the MySQL dialect used in this repo into SQLite."""
+    for pattern, replacement in _REWRITES:
+        query = pattern.sub(replacement, query)
+    match = _ON_DUPLICATE.search(query)
+    if match:
+        # SQLite >= 3.35 allows the conflict target to be omitted on the last upsert clause
+        head, tail = query[:match.start()], query[match.end():]
+        query = head + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", tail)
+    return query
+
+
+def _is_dict_cursor(cursor_class):
+    return cursor_class is not None and "Dict" in cursor_class.__name__
+
+
+class SQLiteCursor:
+    def __init__(self, connection, dict_rows):
+        self._connection = connection
+        self._dict_rows = dict_rows
+        self._cursor = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    def _row(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    async def execute(self, query, args=None):
+        sql = translate(query)
+        params = tuple(args) if args is not None else ()
+        self._cursor = await asyncio.to_thread(self._connection.raw.execute, sql, params)
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    async def executemany(self, query, args):
+        sql = translate(query)
+        self._cursor = await asyncio.to_thread(self._connection.raw.executemany, sql, [tuple(a) for a in args])
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    async def fetchone(self):
+        return self._row(await asyncio.to_thread(self._cursor.fetchone))
+
+    async def fetchmany(self, size=None):
+        rows = await asyncio.to_thread(self._cursor.fetchmany, size or self._cursor.arraysize)
+        return [self._row(row) for row in rows]
+
+    async def fetchall(self):
+        rows = await asyncio.to_thread(self._cursor.fetchall)
+        return [self._row(row) for row in rows]
+
+    async def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class SQLiteConnection:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self, _is_dict_cursor(cursor_class))
+
+    async def begin(self):
+        # IMMEDIATE takes the write lock up front so two writers can't deadlock on upgrade
+        await asyncio.to_thread(self.raw.execute, "BEGIN IMMEDIATE")
+
+    async def commit(self):
+        await asyncio.to_thread(self.raw.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self.raw.rollback)
+
+    def close(self):
+        self.raw.close()
+
+
+class _AcquireContext:
+    """Supports both `await pool.acquire()` and `async with pool.acquire()`, like aiomysql."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._pool._get().__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._pool._get()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._conn.raw.in_transaction:
+            # Same rule as aiomysql: never hand out a connection mid-transaction
+            await self._conn.rollback()
+        self._pool.release(self._conn)
+        self._conn = None
+        return False
+
+
+class SQLitePool:
+    def __init__(self, path, size, busy_timeout):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.closed = False
+        self._free = asyncio.Queue()
+        self._all = []
+
+    def _connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # autocommit, matching the MySQL pools
+            check_same_thread=False
+        )
+        raw.execute("PRAGMA journal_mode=WAL;")
+        raw.execute("PRAGMA synchronous=NORMAL;")
+        return SQLiteConnection(raw)
+
+    async def open(self):
+        for _ in range(self.size):
+            conn = await asyncio.to_thread(self._connect)
+            self._all.append(conn)
+            self._free.put_nowait(conn)
+        return self
+
+    async def _get(self):
+        return await self._free.get()
+
+    def acquire(self):
+        return _AcquireContext(self)
+
+    def release(self, conn):
+        if conn.raw.in_transaction:
+            conn.raw.rollback()
+        if not self.closed:
+            self._free.put_nowait(conn)
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        for conn in self._all:
+            conn.close()
+        self._all = []
+
+
+async def create_sqlite_pool(path, size=4, busy_timeout=10.0):
+    """Opens `size` connections to the SQLite file at `path` in WAL mode."""
+    return await SQLitePool(path, size, busy_timeout).open()
+
+
+__all__ = [
+    "Error",
+    "DictCursor",
+    "SSDictCursor",
+    "translate",
+    "create_sqlite_pool"
+]
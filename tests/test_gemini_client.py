@@ -0,0 +1,139 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gemini_client
+from gemini_client import PROMPT, GeminiClassifier, StubModel, create_classifier
+
+
+class CountingStub(StubModel):
+    """StubModel that records how many calls were running at the same time."""
+
+    def __init__(self, reply="VALID", delay=0.0):
+        super().__init__(reply, delay)
+        self.running = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            return await super().generate_content_async(prompt)
+        finally:
+            self.running -= 1
+
+
+class FailingStub(StubModel):
+    async def generate_content_async(self, prompt):
+        raise ValueError("response was blocked")
+
+
+class VerdictParsingTests(unittest.IsolatedAsyncioTestCase):
+    async def test_invalid_anywhere_in_the_reply_flags(self):
+        for reply in ("INVALID", "**INVALID**", "This message is INVALID: $5 sketch"):
+            classifier = GeminiClassifier(StubModel(reply))
+            self.assertEqual(await classifier.verdict("sketch $5"), "INVALID")
+            self.assertEqual(classifier.stats()["invalid"], 1)
+
+    async def test_anything_else_is_valid(self):
+        for reply in ("VALID", "The message looks fine.", ""):
+            classifier = GeminiClassifier(StubModel(reply))
+            self.assertEqual(await classifier.verdict("fullbody $40"), "VALID")
+            self.assertEqual(classifier.stats()["invalid"], 0)
+
+    async def test_message_text_goes_into_the_prompt(self):
+        model = StubModel()
+        await GeminiClassifier(model).verdict("headshot 12 EUR")
+        self.assertEqual(model.prompts, [PROMPT.format(text="headshot 12 EUR")])
+
+    async def test_api_errors_are_counted_and_treated_as_valid(self):
+        classifier = GeminiClassifier(FailingStub())
+        self.assertIsNone(await classifier.verdict("sketch $5"))
+        self.assertEqual(await classifier.classify("sketch $5"), "VALID")
+        self.assertEqual(classifier.stats()["errors"], 2)
+
+
+class TimeoutTests(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_call_times_out(self):
+        classifier = GeminiClassifier(StubModel("INVALID", delay=5), timeout=0.05)
+        started = asyncio.get_running_loop().time()
+        self.assertIsNone(await classifier.verdict("sketch $5"))
+        self.assertLess(asyncio.get_running_loop().time() - started, 1)
+        self.assertEqual(classifier.stats()["timeouts"], 1)
+        self.assertEqual(classifier.stats()["in_flight"], 0)
+
+    async def test_timeout_counts_as_valid(self):
+        classifier = GeminiClassifier(StubModel("INVALID", delay=5), timeout=0.05)
+        self.assertEqual(await classifier.classify("sketch $5"), "VALID")
+
+    async def test_timeout_covers_waiting_for_a_slot(self):
+        classifier = GeminiClassifier(StubModel("INVALID", delay=0.2), timeout=0.3, max_concurrency=1)
+        verdicts = await asyncio.gather(*(classifier.verdict("sketch $5") for _ in range(3)))
+        # The first call finishes at 0.2s; the second would end at 0.4s and the third at 0.6s
+        self.assertEqual(verdicts, ["INVALID", None, None])
+        self.assertEqual(classifier.stats()["timeouts"], 2)
+
+    async def test_event_loop_keeps_running_during_a_call(self):
+        classifier = GeminiClassifier(StubModel(delay=0.2), timeout=1)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        await classifier.verdict("fullbody $40")
+        task.cancel()
+        self.assertGreater(ticks, 5)
+
+
+class ConcurrencyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_calls_in_flight_never_exceed_the_cap(self):
+        model = CountingStub(delay=0.05)
+        classifier = GeminiClassifier(model, timeout=5, max_concurrency=2)
+        verdicts = await asyncio.gather(*(classifier.verdict(f"ad {i}") for i in range(8)))
+        self.assertEqual(verdicts, ["VALID"] * 8)
+        self.assertEqual(model.peak, 2)
+        self.assertEqual(len(model.prompts), 8)
+        self.assertEqual(classifier.stats()["in_flight"], 0)
+
+
+class CreateClassifierTests(unittest.TestCase):
+    def test_gemini_stub_env_selects_the_stub(self):
+        with mock.patch.dict(os.environ, {"GEMINI_STUB": "INVALID", "API_KEY": "key"}):
+            with self.assertLogs("gemini_client", level="WARNING"):
+                classifier = create_classifier()
+        self.assertTrue(classifier.stub)
+        self.assertEqual(classifier.model.reply, "INVALID")
+
+    def test_missing_api_key_falls_back_loudly(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            with self.assertLogs("gemini_client", level="ERROR") as logs:
+                classifier = create_classifier()
+        self.assertTrue(classifier.stub)
+        self.assertEqual(classifier.model.reply, "VALID")
+        self.assertIn("GEMINI CHECK DISABLED", logs.output[0])
+
+    def test_missing_library_falls_back_loudly(self):
+        with mock.patch.dict(os.environ, {"API_KEY": "key"}, clear=True), mock.patch.object(gemini_client, "genai", None):
+            with self.assertLogs("gemini_client", level="ERROR") as logs:
+                classifier = create_classifier()
+        self.assertTrue(classifier.stub)
+        self.assertIn("google-generativeai is not installed", logs.output[0])
+
+    def test_timeout_and_cap_come_from_the_environment(self):
+        with mock.patch.dict(os.environ, {"GEMINI_STUB": "1", "GEMINI_TIMEOUT": "2.5", "GEMINI_CONCURRENCY": "7"}):
+            with self.assertLogs("gemini_client", level="WARNING"):
+                classifier = create_classifier()
+        self.assertEqual(classifier.timeout, 2.5)
+        self.assertEqual(classifier.max_concurrency, 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
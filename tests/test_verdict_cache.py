@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import verdict_cache
+from verdict_cache import VerdictCache, cache_key
+
+
+class CacheKeyTests(unittest.TestCase):
+    def test_case_and_whitespace_are_ignored(self):
+        self.assertEqual(cache_key("Sketch  $5\n"), cache_key("sketch $5"))
+        self.assertNotEqual(cache_key("sketch $5"), cache_key("sketch $6"))
+
+
+class LruTests(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = VerdictCache("unused.json", max_entries=2)
+        cache.put("first", "VALID")
+        cache.put("second", "INVALID")
+        self.assertEqual(cache.get("first"), "VALID")  # Now "second" is the oldest
+        cache.put("third", "VALID")
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(cache.get("first"), "VALID")
+        self.assertEqual(cache.get("third"), "VALID")
+        self.assertEqual(len(cache.entries), 2)
+
+    def test_hits_and_misses_are_counted(self):
+        cache = VerdictCache("unused.json")
+        cache.put("ad", "VALID")
+        cache.get("ad")
+        cache.get("other ad")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+
+class TtlTests(unittest.TestCase):
+    def test_expired_entry_is_a_miss_and_dropped(self):
+        cache = VerdictCache("unused.json", ttl=60)
+        with mock.patch.object(verdict_cache.time, "time", return_value=1000.0):
+            cache.put("ad", "INVALID")
+            cache.snapshot()  # Clears the dirty flag
+        with mock.patch.object(verdict_cache.time, "time", return_value=1059.0):
+            self.assertEqual(cache.get("ad"), "INVALID")
+        with mock.patch.object(verdict_cache.time, "time", return_value=1060.0):
+            self.assertIsNone(cache.get("ad"))
+        self.assertEqual(len(cache.entries), 0)
+        self.assertTrue(cache.dirty)
+
+
+class PersistenceTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "verdict_cache.json")
+
+    def test_save_and_load_round_trip_keeps_verdicts_and_order(self):
+        cache = VerdictCache(self.path, max_entries=3)
+        for text, verdict in (("a", "VALID"), ("b", "INVALID"), ("c", "VALID")):
+            cache.put(text, verdict)
+        cache.get("a")
+        cache.save(cache.snapshot())
+        self.assertFalse(cache.dirty)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+        loaded = VerdictCache(self.path, max_entries=3)
+        self.assertEqual(loaded.load(), 3)
+        self.assertEqual(list(loaded.entries), list(cache.entries))
+        self.assertEqual(loaded.get("b"), "INVALID")
+        # "c" was the least recently used when saved, so it goes first
+        loaded.put("d", "VALID")
+        self.assertIsNone(loaded.get("c"))
+
+    def test_load_drops_expired_entries_and_trims_to_max_entries(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump([["old", "VALID", 10.0], ["x", "VALID", 5000.0], ["y", "INVALID", 5000.0]], f)
+        cache = VerdictCache(self.path, max_entries=1)
+        with mock.patch.object(verdict_cache.time, "time", return_value=1000.0):
+            self.assertEqual(cache.load(), 1)
+        self.assertEqual(list(cache.entries), ["y"])
+
+    def test_missing_file_starts_empty(self):
+        self.assertEqual(VerdictCache(self.path).load(), 0)
+
+    def test_corrupt_file_starts_empty(self):
+        for contents in ("not json", '{"key": "VALID"}', '[["key", "VALID"]]', "[1, 2]"):
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(contents)
+            cache = VerdictCache(self.path)
+            with mock.patch("builtins.print"):
+                self.assertEqual(cache.load(), 0, contents)
+            self.assertEqual(len(cache.entries), 0)
+
+    def test_failed_save_keeps_the_cache_dirty(self):
+        cache = VerdictCache(os.path.join(self.path, "missing", "cache.json"))
+        cache.put("ad", "VALID")
+        with mock.patch("builtins.print"):
+            cache.save(cache.snapshot())
+        self.assertTrue(cache.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Verdict cache for marketplace messages that needed Gemini.
+
+Sellers repost the same ad across channels and days, so Gemini verdicts are
+kept by a hash of the cleaned, normalized text. Entries expire after `ttl`
+seconds and the least recently used ones are dropped past `max_entries`.
+The cache is saved to a JSON file so it survives restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def cache_key(text):
+    """Hashes cleaned message text, ignoring case and whitespace differences."""
+    normalized = _WHITESPACE.sub(" ", text).strip().casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """LRU + TTL map of cache_key(text) -> verdict, persisted to `path`."""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (verdict, expires_at), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    def get(self, text):
+        key = cache_key(text)
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self.entries[key]
+                self.dirty = True
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, text, verdict):
+        key = cache_key(text)
+        self.entries[key] = (verdict, time.time() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def load(self):
+        """Reads the saved cache, dropping expired entries. A missing or broken file starts empty."""
+        now = time.time()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            # Saved least recently used first, so the LRU order carries over
+            for key, verdict, expires_at in saved:
+                if expires_at > now:
+                    self.entries[key] = (verdict, expires_at)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error loading verdict cache: {e}")
+            self.entries.clear()
+            return 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return len(self.entries)
+
+    def snapshot(self):
+        """Returns the entries in save order and marks the cache clean."""
+        self.dirty = False
+        return [[key, verdict, expires_at] for key, (verdict, expires_at) in self.entries.items()]
+
+    def save(self, entries):
+        """Writes a snapshot() to disk atomically. Safe to run in a worker thread."""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.dirty = True
+            print(f"Error saving verdict cache: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+__all__ = [
+    "cache_key",
+    "VerdictCache"
+]
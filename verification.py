@@ -1,7 +1,13 @@
 import discord
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta
+import asyncio
+import heapq
+import io
+import json
+import logging
 import random
+import time
 import string
 from discord import Embed
 import os
@@ -12,32 +18,281 @@ UNVERIFIED_ROLE_ID = 1305172270486126663  # Unverified role
 WELCOME_CHANNEL_ID = 1412710902880538624  # Verification channel
 NOTICE_CHANNEL_ID = 1412710902880538624   # Verification channel (same as above)
 NOTICE_MESSAGE = "You must get the 'Verified' role within 48 hours by sending the password I just DMed you in this chat."
+VERIFICATION_WINDOW = timedelta(hours=48)
+KICK_CONCURRENCY = int(os.getenv('KICK_CONCURRENCY', 3))
+# Seconds to wait for more joins before sending one welcome for all of them
+WELCOME_WINDOW = float(os.getenv('WELCOME_WINDOW', 2.0))
+RAID_ALERT_CHANNEL_ID = int(os.getenv('RAID_ALERT_CHANNEL_ID', 0))
+# "password" DMs a plaintext password, "captcha" an image challenge (needs Pillow)
+VERIFICATION_MODE = os.getenv('VERIFICATION_MODE', 'password').lower()
+RAID_LOCKDOWN_MINUTES = float(os.getenv('RAID_LOCKDOWN_MINUTES', 30))
+# A running lockdown is saved here so a restart or reload picks it up again
+LOCKDOWN_STATE_PATH = os.getenv('LOCKDOWN_STATE_PATH', 'lockdown_state.json')
 
 
 intents = discord.Intents.default()
 intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+from raid_detector import RaidDetector
+from captcha_pool import CaptchaPool, captcha_available
 from dbconn import (
     add_user,
-    get_user_by_id,
-    get_password_by_user_id,
-    get_join_time_by_user_id,
-    check_user_exists,
-    delete_user_by_id
+    get_pending_users,
+    delete_user_by_id,
+    delete_users_by_ids
 )
 
 GUILD_ID = 1240448660266029126
 
+logger = logging.getLogger("verification")
+
+
+def as_datetime(join_time):
+    if isinstance(join_time, str):
+        return datetime.strptime(join_time, '%Y-%m-%d %H:%M:%S')
+    return join_time
+
+
+class DeadlineScheduler:
+    """Min-heap of (deadline, member_id) that sleeps until the earliest deadline is due.
+
+    Entries are never removed early; the caller checks whether a popped entry
+    still applies (the member may have verified or rejoined since).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self._wake = asyncio.Event()
+
+    def push(self, deadline, member_id):
+        heapq.heappush(self.heap, (deadline, member_id))
+        if self.heap[0] == (deadline, member_id):
+            self._wake.set()  # New earliest deadline, recompute the sleep
+
+    def pop_due(self):
+        """Pops every entry whose deadline has already passed."""
+        now = datetime.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    async def next_due(self):
+        """Waits until the earliest deadline has passed, then pops and returns it."""
+        while True:
+            self._wake.clear()
+            if not self.heap:
+                await self._wake.wait()
+                continue
+            delay = (self.heap[0][0] - datetime.now()).total_seconds()
+            if delay <= 0:
+                return heapq.heappop(self.heap)
+            try:
+                # Capped so a jump in the wall clock is noticed within the hour
+                await asyncio.wait_for(self._wake.wait(), timeout=min(delay, 3600))
+            except asyncio.TimeoutError:
+                pass
+
+
+class MentionCoalescer:
+    """Collects members for a short window and sends one message for the whole batch.
+
+    The first member starts a `window` second timer; everyone who arrives
+    before it fires is included in the same message. A batch is sent early
+    once it reaches `max_batch` members so the mentions fit in one message.
+    """
+
+    def __init__(self, send, window=2.0, max_batch=50):
+        self.send = send
+        self.window = window
+        self.max_batch = max_batch
+        self.members = []
+        self._timer = None
+        self._tasks = set()
+
+    def add(self, member):
+        self.members.append(member)
+        if len(self.members) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.members = self.members, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            await self.send(batch)
+        except discord.HTTPException as e:
+            print(f"Error sending message for {len(batch)} members: {e}")
+
+
+class KickExecutor:
+    """Kicks a batch of members with bounded concurrency.
+
+    discord.py already waits out 429s per rate-limit bucket; the semaphore
+    keeps a raid-sized batch from queueing hundreds of requests on the
+    guild's kick bucket at once.
+    """
+
+    def __init__(self, concurrency=3):
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _kick(self, member, reason, result):
+        async with self.semaphore:
+            try:
+                await member.kick(reason=reason)
+                result["kicked"].append(member)
+            except discord.NotFound:
+                result["gone"].append(member)
+            except discord.HTTPException as e:
+                # Rate limits and server errors may pass; a missing permission or role hierarchy won't
+                if e.status == 429 or e.status >= 500:
+                    result["failed"].append((member, e))
+                else:
+                    result["refused"].append((member, e))
+
+    async def run(self, members, reason):
+        """Kicks `members`. Returns a dict of kicked, gone, failed (worth retrying) and refused
+        (permanent, e.g. Forbidden) members plus the elapsed time."""
+        result = {"kicked": [], "gone": [], "failed": [], "refused": []}
+        started = time.monotonic()
+        await asyncio.gather(*(self._kick(member, reason, result) for member in members))
+        result["elapsed"] = time.monotonic() - started
+        return result
+
+
 class Security(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.check_roles.start()  # Start the task here
+        # Write-through copy of user_data: member_id -> (password, join_time)
+        self.pending = {}
+        self.pending_loaded = False
+        self.expiring = set()  # Members being kicked by expire_members; their removals are handled there
+        self.parked = set()  # Expired members the bot isn't allowed to kick; kept pending but not rescheduled
+        self.deadlines = DeadlineScheduler()
+        self.kicker = KickExecutor(KICK_CONCURRENCY)
+        self.welcomes = MentionCoalescer(self.send_welcomes, WELCOME_WINDOW)
+        self.dm_notices = MentionCoalescer(self.send_dm_notices, WELCOME_WINDOW)
+        self.raid = RaidDetector(
+            window=int(os.getenv('RAID_WINDOW_SECONDS', 120)),
+            join_threshold=int(os.getenv('RAID_JOIN_THRESHOLD', 30)),
+            young_days=int(os.getenv('RAID_YOUNG_ACCOUNT_DAYS', 7)),
+            young_threshold=int(os.getenv('RAID_YOUNG_THRESHOLD', 20)),
+            cluster_threshold=int(os.getenv('RAID_CLUSTER_THRESHOLD', 15))
+        )
+        self.lockdown = None  # {"previous_level", "started", "ends_at", "held": [member ids], "task"} while locked down
+        self.captchas = None
+        if VERIFICATION_MODE == "captcha":
+            if captcha_available():
+                self.captchas = CaptchaPool(
+                    size=int(os.getenv('CAPTCHA_POOL_SIZE', 50)),
+                    workers=int(os.getenv('CAPTCHA_WORKERS', 2))
+                )
+            else:
+                logger.warning("VERIFICATION_MODE=captcha needs Pillow (pip install 'Pillow>=10.1'); falling back to plain passwords.")
+        self.expiry_task = None
+
+    async def cog_load(self):
+        await self.load_pending()
+        self.restore_lockdown()
+        self.expiry_task = asyncio.create_task(self.expire_unverified())
+        self.reconcile_pending.start()
+        if self.captchas:
+            self.captchas.start()
+
+    async def cog_unload(self):
+        if self.expiry_task:
+            self.expiry_task.cancel()
+        if self.lockdown:
+            # The saved state stays behind; the next cog_load resumes the lockdown and sends the held DMs
+            self.lockdown["task"].cancel()
+        self.reconcile_pending.cancel()
+        if self.captchas:
+            await self.captchas.stop()
+        self.welcomes.flush()
+        self.dm_notices.flush()
+
+    async def load_pending(self):
+        """Fills the pending-verification index from user_data. Returns True once loaded."""
+        rows = await get_pending_users()
+        if rows is None:
+            return False
+        # Merge rather than replace: members who joined while add_user was failing only exist in memory
+        loaded = {}
+        for row in rows:
+            member_id = int(row['user_id'])
+            if member_id not in self.pending:
+                loaded[member_id] = (row['password'], as_datetime(row['join_time']))
+        self.pending.update(loaded)
+        for member_id, (password, join_time) in loaded.items():
+            if join_time:
+                self.deadlines.push(join_time + VERIFICATION_WINDOW, member_id)
+        self.pending_loaded = True
+        print(f"Loaded {len(loaded)} pending verifications ({len(self.pending)} in total).")
+        return True
+
+    async def get_pending(self, member_id):
+        """Returns (password, join_time) for a member who hasn't verified yet, or None."""
+        if not self.pending_loaded:
+            await self.load_pending()  # The database was down at startup
+        return self.pending.get(member_id)
+
+    async def add_pending(self, member_id, join_time, password):
+        self.pending[member_id] = (password, join_time)
+        self.parked.discard(member_id)
+        self.deadlines.push(join_time + VERIFICATION_WINDOW, member_id)
+        if not await add_user(member_id, join_time, password):
+            print(f"Verification for {member_id} is only kept in memory until the next restart.")
+
+    async def remove_pending(self, member_id):
+        self.pending.pop(member_id, None)
+        self.parked.discard(member_id)
+        return await delete_user_by_id(member_id)
+
+    async def swap_to_verified(self, member):
+        """Gives the Verified role and drops Unverified in a single member update."""
+        roles = [role for role in member.roles if not role.is_default() and role.id != UNVERIFIED_ROLE_ID]
+        verified_role = member.guild.get_role(REQUIRED_ROLE_ID)
+        if verified_role and verified_role not in roles:
+            roles.append(verified_role)
+        await member.edit(roles=roles, reason="Correct verification password provided.")
 
     def generate_password(self, length=8):
         characters = string.ascii_letters + string.digits
         return ''.join(random.choice(characters) for _ in range(length))
 
+    async def new_challenge(self):
+        """Returns (answer, image). image is None in password mode."""
+        if self.captchas:
+            return await self.captchas.take()
+        return self.generate_password(), None
+
+    async def challenge_message(self, password, image=None):
+        """Builds the send() arguments that deliver a verification answer to a member."""
+        if not self.captchas:
+            return {"content": f"{password}"}
+        if image is None:
+            image = await self.captchas.render(password)
+        return {
+            "content": "Type the characters in this image in the verification chat (not case sensitive).",
+            "file": discord.File(io.BytesIO(image), filename="captcha.png")
+        }
+
+    def answer_matches(self, content, stored_password):
+        if content == stored_password:
+            return True
+        # Captcha answers are upper case only, so accept any casing for them
+        return self.captchas is not None and content.strip().upper() == stored_password
+
     async def log_event(self, message, member=None):
         # You can customize this to log to a channel or just print
         print(f"[LOG] {message}")
@@ -46,51 +301,280 @@ class Security(commands.Cog):
     async def on_member_join(self, member):
         if member.guild.id != GUILD_ID:
             return
-        password = self.generate_password()
+        password, image = await self.new_challenge()
+        reason = self.raid.record_join(member.joined_at or discord.utils.utcnow(), member.created_at)
+        if reason and not self.lockdown:
+            await self.start_lockdown(member.guild, reason)
+
+        steps = [self.assign_unverified(member), self.add_pending(member.id, datetime.now(), password)]
+        if self.lockdown:
+            self.lockdown["held"].append(member.id)  # DMs wait until the lockdown ends
+        else:
+            steps.append(self.send_password(member, password, image))
+        # Role, database row and DMs don't depend on each other, so run them side by side
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error setting up verification for {member.name}: {result}")
+
+        self.welcomes.add(member)
+        await self.log_event(f"{member.name} has joined the server and was sent a verification password.", member)
+
+    async def assign_unverified(self, member):
         unverified_role = member.guild.get_role(UNVERIFIED_ROLE_ID)
-        
         if unverified_role:
             await member.add_roles(unverified_role, reason="New member - assigned Unverified role")
             await self.log_event(f"{member.name} was given the Unverified role.", member)
 
-        add_user(member.id, datetime.now(), password)
-
+    async def send_password(self, member, password, image=None):
         try:
             await member.send(f"Welcome to the server, {member.name}! Here is your password, make sure to send this password in the verification chat!")
-            await member.send(f"{password}")
+            await member.send(**await self.challenge_message(password, image))
         except discord.Forbidden:
             print(f"Could not send DM to {member.name}. They may have DMs disabled.")
-            notice_channel = self.bot.get_channel(NOTICE_CHANNEL_ID)
-            
-            if notice_channel:
-                embed = Embed(
-                    title="Didn't get a message?",
-                    description=(
-                        "Make sure that you have your DMs enabled!\n"
-                        "**Settings > Content & Social** (check the image below)\n\n"
-                        "Once you have turned your DMs on, run the command:\n"
-                        "`!DMuser YourUserID` (e.g., `!DMuser 766005564190359552`)\n\n"
-                        "If you are still having trouble getting the password, please contact our staff via <#1243567293750050887>."
-                    ),
-                    color=discord.Color.red()
-                )
-
-                embed.set_image(url="https://media.discordapp.net/attachments/1245431550942904341/1336622814542696468/image-2.png?ex=67b1a980&is=67b05800&hm=4c2e1dec22d38e5803c4fcc8f715d363505f1ce9bf40219a5c85555f33ece0e3&=&format=webp&quality=lossless&width=614&height=218")
-                
-                await notice_channel.send(content=f"{member.mention}", embed=embed)
-            else:
-                print(f"Notice channel with ID {NOTICE_CHANNEL_ID} not found.")
-
+            if self.captchas:
+                # An image is safe to post publicly, so skip the DM round trip entirely
+                notice_channel = self.bot.get_channel(NOTICE_CHANNEL_ID)
+                if notice_channel:
+                    message = await self.challenge_message(password, image)
+                    message["content"] = f"{member.mention} I couldn't DM you. {message['content']}"
+                    await notice_channel.send(**message, delete_after=600)
+                    return
+            self.dm_notices.add(member)
+
+    async def send_welcomes(self, members):
         welcome_channel = self.bot.get_channel(WELCOME_CHANNEL_ID)
         if welcome_channel:
+            mentions = " ".join(member.mention for member in members)
             await welcome_channel.send(
-                f"Welcome {member.mention}! {NOTICE_MESSAGE}"
+                f"Welcome {mentions}! {NOTICE_MESSAGE}"
             )
         else:
             print(f"Welcome channel with ID {WELCOME_CHANNEL_ID} not found.")
 
+    async def send_dm_notices(self, members):
+        notice_channel = self.bot.get_channel(NOTICE_CHANNEL_ID)
+        if not notice_channel:
+            print(f"Notice channel with ID {NOTICE_CHANNEL_ID} not found.")
+            return
+        embed = Embed(
+            title="Didn't get a message?",
+            description=(
+                "Make sure that you have your DMs enabled!\n"
+                "**Settings > Content & Social** (check the image below)\n\n"
+                "Once you have turned your DMs on, run the command:\n"
+                "`!DMuser YourUserID` (e.g., `!DMuser 766005564190359552`)\n\n"
+                "If you are still having trouble getting the password, please contact our staff via <#1243567293750050887>."
+            ),
+            color=discord.Color.red()
+        )
+
+        embed.set_image(url="https://media.discordapp.net/attachments/1245431550942904341/1336622814542696468/image-2.png?ex=67b1a980&is=67b05800&hm=4c2e1dec22d38e5803c4fcc8f715d363505f1ce9bf40219a5c85555f33ece0e3&=&format=webp&quality=lossless&width=614&height=218")
+
+        await notice_channel.send(content=" ".join(member.mention for member in members), embed=embed)
+
+    async def start_lockdown(self, guild, reason):
+        """Pauses verification DMs, raises the guild verification level and alerts staff."""
+        self.lockdown = {
+            "previous_level": guild.verification_level,
+            "started": datetime.now().replace(microsecond=0),
+            "ends_at": time.time() + RAID_LOCKDOWN_MINUTES * 60,
+            "held": [],
+            "task": None
+        }
+        self.save_lockdown()
+        try:
+            if guild.verification_level < discord.VerificationLevel.high:
+                await guild.edit(verification_level=discord.VerificationLevel.high, reason=f"Raid lockdown: {reason}")
+        except discord.HTTPException as e:
+            print(f"Could not raise the verification level: {e}")
+        self.lockdown["task"] = asyncio.create_task(self.end_lockdown_later(guild))
+
+        stats = self.raid.snapshot()
+        embed = Embed(title="🚨 Raid lockdown", description=reason, color=discord.Color.red())
+        embed.add_field(name=f"Joins in the last {stats['window']}s", value=str(stats["joins"]), inline=True)
+        embed.add_field(name="Largest same-hour account cluster", value=str(stats["largest_creation_cluster"]), inline=True)
+        embed.add_field(
+            name="Account ages",
+            value="\n".join(f"{label}: {count}" for label, count in stats["age_histogram"].items()),
+            inline=False
+        )
+        embed.set_footer(text=f"Verification DMs paused for {RAID_LOCKDOWN_MINUTES:g} minutes. End early with !endlockdown.")
+        await self.send_alert(embed)
+        await self.log_event(f"Raid lockdown started: {reason}")
+
+    def is_held(self, member_id):
+        """True while a raid lockdown is holding back this member's verification DM."""
+        return self.lockdown is not None and member_id in self.lockdown["held"]
+
+    async def end_lockdown_later(self, guild):
+        await asyncio.sleep(max(0.0, self.lockdown["ends_at"] - time.time()))
+        await self.end_lockdown(guild)
+
+    def save_lockdown(self):
+        """Writes the running lockdown to LOCKDOWN_STATE_PATH, or removes the file when there is none."""
+        try:
+            if self.lockdown is None:
+                os.remove(LOCKDOWN_STATE_PATH)
+                return
+            with open(LOCKDOWN_STATE_PATH, "w", encoding="utf-8") as f:
+                json.dump({
+                    "previous_level": self.lockdown["previous_level"].value,
+                    "started": self.lockdown["started"].strftime('%Y-%m-%d %H:%M:%S'),
+                    "ends_at": self.lockdown["ends_at"]
+                }, f)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not save the raid lockdown state: {e}")
+
+    def restore_lockdown(self):
+        """Picks up a lockdown that was still running when the bot stopped or the cog was reloaded."""
+        try:
+            with open(LOCKDOWN_STATE_PATH, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.lockdown = {
+                "previous_level": discord.VerificationLevel(state["previous_level"]),
+                "started": as_datetime(state["started"]),
+                "ends_at": float(state["ends_at"]),
+                "held": [],
+                "task": None
+            }
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not restore the raid lockdown state: {e}")
+            return
+        self.lockdown["task"] = asyncio.create_task(self.resume_lockdown())
+
+    async def resume_lockdown(self):
+        await self.bot.wait_until_ready()
+        if not self.pending_loaded:
+            await self.load_pending()
+        # The held list lived in memory; everyone still pending who joined since the lockdown started was held
+        started = self.lockdown["started"]
+        self.lockdown["held"] += [
+            member_id for member_id, (password, join_time) in self.pending.items()
+            if join_time is not None and join_time >= started
+        ]
+        guild = self.bot.get_guild(GUILD_ID)
+        if guild is None:
+            print("Raid lockdown restored, but the guild isn't available; end it with !endlockdown.")
+            return
+        await self.log_event(f"Raid lockdown resumed after a restart, {len(set(self.lockdown['held']))} DMs held.")
+        await self.end_lockdown_later(guild)
+
+    async def end_lockdown(self, guild):
+        """Restores the verification level and sends the passwords that were held back."""
+        lockdown, self.lockdown = self.lockdown, None
+        if lockdown is None:
+            return 0
+        self.save_lockdown()
+        if lockdown["task"] and lockdown["task"] is not asyncio.current_task():
+            lockdown["task"].cancel()
+        self.raid.reset()
+        try:
+            await guild.edit(verification_level=lockdown["previous_level"], reason="Raid lockdown ended")
+        except discord.HTTPException as e:
+            print(f"Could not restore the verification level: {e}")
+
+        # Only members who are still here and still unverified get their DM
+        held = [
+            (member, self.pending[member.id][0])
+            for member in map(guild.get_member, dict.fromkeys(lockdown["held"]))
+            if member is not None and member.id in self.pending
+        ]
+        for member, password in held:
+            await self.send_password(member, password)
+        await self.send_alert(Embed(
+            title="Raid lockdown ended",
+            description=f"Verification DMs resumed; sent {len(held)} held passwords.",
+            color=discord.Color.green()
+        ))
+        await self.log_event(f"Raid lockdown ended, {len(held)} held passwords sent.")
+        return len(held)
+
+    async def send_alert(self, embed):
+        channel = self.bot.get_channel(RAID_ALERT_CHANNEL_ID) if RAID_ALERT_CHANNEL_ID else None
+        if channel is None:
+            print(f"[RAID] {embed.title}: {embed.description}")
+            return
+        try:
+            await channel.send(embed=embed)
+        except discord.HTTPException as e:
+            print(f"Could not send raid alert: {e}")
 
-        await self.log_event(f"{member.name} has joined the server and was sent a verification password.", member)
+    @commands.command(name="endlockdown", help="Ends a raid lockdown early and sends the held verification DMs.")
+    @commands.has_permissions(manage_guild=True)
+    async def end_lockdown_command(self, ctx):
+        if ctx.guild is None or ctx.guild.id != GUILD_ID:
+            return
+        if not self.lockdown:
+            await ctx.send("There is no raid lockdown running.")
+            return
+        sent = await self.end_lockdown(ctx.guild)
+        await ctx.send(f"Raid lockdown ended. Sent {sent} held verification passwords.")
+
+    @commands.command(name="raidstatus", help="Shows the join statistics the raid detector is watching.")
+    @commands.has_permissions(manage_guild=True)
+    async def raid_status(self, ctx):
+        stats = self.raid.snapshot()
+        ages = ", ".join(f"{label}: {count}" for label, count in stats["age_histogram"].items())
+        state = f"locked down, {len(self.lockdown['held'])} DMs held" if self.lockdown else "normal"
+        await ctx.send(
+            f"Raid detector: {state}\n"
+            f"Joins in the last {stats['window']}s: {stats['joins']} "
+            f"(largest same-hour account cluster: {stats['largest_creation_cluster']})\n"
+            f"Account ages: {ages}"
+        )
+
+    @commands.command(name="captchastats", help="Shows how often joins got a pre-rendered captcha.")
+    @commands.has_permissions(manage_guild=True)
+    async def captcha_stats(self, ctx):
+        if not self.captchas:
+            await ctx.send("Captcha verification is not enabled.")
+            return
+        stats = self.captchas.stats()
+        hit_rate = f"{stats['hit_rate']:.0%}" if stats["hit_rate"] is not None else "n/a"
+        await ctx.send(
+            f"Captcha pool: {stats['ready']}/{stats['size']} ready, "
+            f"{stats['hits']} hits, {stats['misses']} misses (hit rate {hit_rate})"
+        )
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        if member.guild.id != GUILD_ID:
+            return
+        if member.id in self.pending and member.id not in self.expiring:
+            await self.remove_pending(member.id)
+            await self.log_event(f"{member.name} left before verifying; removed their verification details.")
+
+    @tasks.loop(hours=6)
+    async def reconcile_pending(self):
+        """Drops user_data rows for people who left or verified while the bot wasn't watching."""
+        guild = self.bot.get_guild(GUILD_ID)
+        if guild is None or not guild.chunked:
+            return  # Without the full member list every row would look stale
+        # The index mirrors user_data, so the diff itself needs no query
+        if not self.pending_loaded and not await self.load_pending():
+            return
+        required_role = guild.get_role(REQUIRED_ROLE_ID)
+        stale = []
+        for member_id in list(self.pending):
+            member = guild.get_member(member_id)
+            if member is None or (required_role and required_role in member.roles):
+                stale.append(member_id)
+        if not stale:
+            return
+        for member_id in stale:
+            self.pending.pop(member_id, None)
+            self.parked.discard(member_id)
+        deleted = await delete_users_by_ids(stale)
+        await self.log_event(f"Reconciled user_data: removed {deleted} stale of {len(stale) + len(self.pending)} pending verifications.")
+
+    @reconcile_pending.before_loop
+    async def before_reconcile_pending(self):
+        await self.bot.wait_until_ready()
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -102,20 +586,15 @@ class Security(commands.Cog):
         if message.channel.id == NOTICE_CHANNEL_ID:
             member_id = message.author.id
 
-            if check_user_exists(member_id):
-                stored_password = get_password_by_user_id(member_id)
-                if message.content == stored_password:
-                    verified_role = message.guild.get_role(REQUIRED_ROLE_ID)
-                    unverified_role = message.guild.get_role(UNVERIFIED_ROLE_ID)
-
-                    if verified_role:
-                        await message.author.add_roles(verified_role, reason="Correct verification password provided.")
-                    if unverified_role:
-                        await message.author.remove_roles(unverified_role, reason="Member verified - removed Unverified role")
+            pending = await self.get_pending(member_id)
+            if pending:
+                stored_password = pending[0]
+                if self.answer_matches(message.content, stored_password):
+                    await self.swap_to_verified(message.author)
 
                     await self.log_event(f"{message.author.name} has been successfully verified.", message.author)
 
-                    delete_user_by_id(member_id)
+                    await self.remove_pending(member_id)
 
                 else:
                     await message.channel.send(
@@ -132,14 +611,18 @@ class Security(commands.Cog):
             return
         member = ctx.author
         member_id = member.id
+        if self.is_held(member_id):
+            await ctx.send(f"{member.mention}, verification is paused right now. You'll get your password by DM as soon as it resumes.")
+            return
 
-        if not check_user_exists(member_id):
+        pending = await self.get_pending(member_id)
+        if not pending:
             await ctx.send(
                 f"{member.mention}, I couldn't find your verification details. Please make sure you've recently joined the server."
             )
             return
 
-        password = get_password_by_user_id(member_id)
+        password = pending[0]
         if not password:
             await ctx.send(
                 f"{member.mention}, something went wrong. Please contact a moderator for assistance."
@@ -147,7 +630,7 @@ class Security(commands.Cog):
             return
 
         try:
-            await member.send(f"{password}")
+            await member.send(**await self.challenge_message(password))
             await ctx.send(f"{member.mention}, I've sent your verification password to your DMs. Please check!")
         except discord.Forbidden:
             await ctx.send(
@@ -162,8 +645,12 @@ class Security(commands.Cog):
         if ctx.guild is None or ctx.guild.id != GUILD_ID:
             return
         member_id = user.id
+        if self.is_held(member_id):
+            await ctx.send(f"{user.mention}, verification is paused right now. The password will be sent by DM as soon as it resumes.")
+            return
 
-        password = get_password_by_user_id(member_id)
+        pending = await self.get_pending(member_id)
+        password = pending[0] if pending else None
         if not password:
             await ctx.send(
                 f"{user.mention}, something went wrong. Please contact a moderator for assistance through <#1243567293750050887>."
@@ -172,7 +659,7 @@ class Security(commands.Cog):
 
         try:
             await user.send(f"Hello {user.name}, here is your verification password:")
-            await user.send(f"{password}")
+            await user.send(**await self.challenge_message(password))
             await ctx.send(f"{user.mention}, I've sent your verification password to your DMs. Please check!")
         except discord.Forbidden:
             await ctx.send(
@@ -182,34 +669,83 @@ class Security(commands.Cog):
         # Log DM request for another user
         await self.log_event(f"Verification password was resent to {user.name} by {ctx.author.name}.")
 
-    @tasks.loop(minutes=60)
-    async def check_roles(self):
+    async def expire_unverified(self):
+        """Kicks unverified members as their 48 hour deadlines pass, all due members in one batch."""
+        await self.bot.wait_until_ready()
+        while True:
+            due = [await self.deadlines.next_due()] + self.deadlines.pop_due()
+            expired = [
+                member_id for deadline, member_id in due
+                if member_id in self.pending
+                and member_id not in self.parked
+                and self.pending[member_id][1] is not None
+                # An earlier deadline means the member rejoined since; retries are scheduled later
+                and deadline >= self.pending[member_id][1] + VERIFICATION_WINDOW
+            ]
+            if not expired:
+                continue
+            try:
+                await self.expire_members(expired)
+            except Exception as e:
+                print(f"Error expiring {len(expired)} verifications: {e}")
+
+    async def expire_members(self, member_ids):
+        guild = self.bot.get_guild(GUILD_ID)
+        required_role = guild.get_role(REQUIRED_ROLE_ID) if guild else None
+        if required_role is None:
+            # Guild or role cache not ready; the deadlines were already popped, so schedule them again
+            retry_at = datetime.now() + timedelta(minutes=10)
+            for member_id in dict.fromkeys(member_ids):
+                self.deadlines.push(retry_at, member_id)
+            return
+        to_kick, finished = [], []
+        for member_id in dict.fromkeys(member_ids):
+            member = guild.get_member(member_id)
+            if member is None:
+                continue
+            if required_role in member.roles:
+                finished.append(member_id)  # Verified some other way
+            else:
+                to_kick.append(member)
+
+        # The kicks fire on_member_remove; keep it from deleting these rows one by one
+        kicking = {member.id for member in to_kick}
+        self.expiring |= kicking
         try:
-            for guild in self.bot.guilds:
-                if guild.id != GUILD_ID:
-                    continue
-                for member in guild.members:
-                    if check_user_exists(member.id):  
-                        join_time = get_join_time_by_user_id(member.id)
-                        if not join_time:
-                            print(f"No join time found for {member.name}. Skipping.")
-                            continue
-                        # Convert to datetime if necessary
-                        if isinstance(join_time, str):
-                            join_time = datetime.strptime(join_time, '%Y-%m-%d %H:%M:%S')
-
-                        time_since_join = datetime.now() - join_time
-                        if time_since_join >= timedelta(hours=48):
-                            required_role = guild.get_role(REQUIRED_ROLE_ID)
-                            if required_role and required_role not in member.roles:
-                                await member.kick(reason="Failed to get required role within 48 hours.")
-                                print(f"Kicked {member.name} for not verifying in time.")
-                                delete_user_by_id(member.id)
-
-                                # Log kick event
-                                await self.log_event(f"{member.name} was kicked for failing to verify within 48 hours.")
-        except Exception as e:
-            print(f"Error in check_roles task: {e}")
+            result = await self.kicker.run(to_kick, "Failed to get required role within 48 hours.")
+            finished += [member.id for member in result["kicked"] + result["gone"]]
+            # Refused kicks won't succeed on retry; keep their rows so they can still verify, but stop rescheduling
+            self.parked |= {member.id for member, error in result["refused"]}
+            for member_id in finished:
+                self.pending.pop(member_id, None)
+            await delete_users_by_ids(finished)
+        finally:
+            self.expiring -= kicking
+        for member, error in result["failed"]:
+            self.deadlines.push(datetime.now() + timedelta(minutes=10), member.id)
+
+        if to_kick:
+            kicked = len(result["kicked"])
+            rate = kicked / result["elapsed"] if result["elapsed"] else kicked
+            summary = (
+                f"Verification expiry: kicked {kicked} of {len(to_kick)} members in {result['elapsed']:.1f}s "
+                f"({rate:.1f}/s), {len(result['gone'])} already gone, {len(result['failed'])} failed, "
+                f"{len(result['refused'])} refused."
+            )
+            if result["failed"]:
+                summary += " Retrying in 10 minutes: " + ", ".join(f"{member.name} ({error.status})" for member, error in result["failed"][:20])
+            await self.log_event(summary)
+        if result["refused"]:
+            await self.send_alert(Embed(
+                title="Could not kick unverified members",
+                description=(
+                    "These members missed the 48 hour verification deadline but the bot isn't allowed to kick them "
+                    "(missing Kick Members permission or a role above the bot's). They can still verify but won't be kicked "
+                    "again until the bot restarts:\n"
+                    + "\n".join(f"{member.mention} ({error.status})" for member, error in result["refused"][:30])
+                ),
+                color=discord.Color.orange()
+            ))
 
 async def setup(bot):
     await bot.add_cog(Security(bot))